@@ -1,8 +1,44 @@
-from flask import Flask, request, render_template_string, send_file
-import pandas as pd
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
+from markupsafe import Markup
+from datetime import datetime, timedelta, timezone
+from functools import cached_property
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import ClosingIterator
+from bisect import bisect_left
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from catalog_export import export_writers, streamed_formats
+from catalog_store import catalog_version, load_defects, source_stamp
+from compact_catalog import CompactCatalog
+from defect_ranking import DefectRanker, rank_limit
+from defect_search import SearchIndex
+from flavor_vocabulary import FlavorVocabulary
+from jobs import JobRunner
+from metrics import Metrics
+from panel_rollups import PanelStore
+from query_cache import QueryCache, troubleshoot_key
+from recipe_analysis import RuleIndex, analyze_batch_log, parse_recipe_value, rule_issue
+from sensor_logs import analyze_sensor_frames, open_sensor_log
 
 app = Flask(__name__)
 
+# Request and hot-path timings served at /metrics. Set BEER_DEFECTS_METRICS_DIR
+# to a directory shared by the gunicorn workers to report all of them.
+metrics = Metrics(directory=os.environ.get("BEER_DEFECTS_METRICS_DIR") or None)
+
 # Comprehensive beer flavor defects dictionary
 flavor_defects = {
     "Diacetyl": {
@@ -22,6 +58,38 @@ flavor_defects = {
         "Learn More": "https://beerandbrewing.com/off-flavor-diacetyl/",
         "Category": "Fermentation"
     },
+    "Acetaldehyde": {
+        "Chemical Makeup": "Ethanal",
+        "Brewing Stage": "Fermentation",
+        "Origins": "Incomplete fermentation or premature bottling/kegging.",
+        "Off-Flavors": ["Green Apple", "Raw Pumpkin"],
+        "Solutions": [
+            "Allow the beer to fully ferment and condition before packaging.",
+            "Increase the fermentation temperature slightly for lagers to allow yeast to clean up residual acetaldehyde."
+        ],
+        "Prevention": [
+            "Give the beer adequate time for fermentation and conditioning.",
+            "Avoid stress on the yeast by maintaining a consistent fermentation temperature."
+        ],
+        "Learn More": "https://beerandbrewing.com/off-flavor-acetaldehyde/",
+        "Category": "Fermentation"
+    },
+    "DMS (Dimethyl Sulfide)": {
+        "Chemical Makeup": "Dimethyl sulfide",
+        "Brewing Stage": "Boil",
+        "Origins": "Improper wort boil or rapid cooling, or bacterial contamination.",
+        "Off-Flavors": ["Cooked Corn", "Cabbage", "Vegetal"],
+        "Solutions": [
+            "Ensure a vigorous boil to drive off DMS precursors.",
+            "Cool the wort quickly after the boil to prevent further DMS formation."
+        ],
+        "Prevention": [
+            "Avoid covering the boil kettle, which traps DMS.",
+            "Use high-quality malt with lower DMS precursors."
+        ],
+        "Learn More": "https://beerandbrewing.com/off-flavor-dms/",
+        "Category": "Boil"
+    },
     "Phenolic": {
         "Chemical Makeup": "Phenols",
         "Brewing Stage": "Fermentation",
@@ -132,6 +200,161 @@ flavor_defects = {
    }
 }
 
+# Other ways panelists describe the catalog's off-flavors, mapped to the
+# Off-Flavors term they mean. Spelling variants, plurals and "-y"/"-like"
+# endings are handled by the vocabulary's stemming, so only genuinely
+# different wording belongs here. Entries for terms the loaded catalog
+# doesn't use are ignored.
+flavor_synonyms = {
+    "butter": "Buttery",
+    "movie popcorn": "Buttery",
+    "popcorn": "Buttery",
+    "slick": "Buttery",
+    "apple": "Green Apple",
+    "cidery": "Green Apple",
+    "pumpkin": "Raw Pumpkin",
+    "creamed corn": "Cooked Corn",
+    "canned corn": "Cooked Corn",
+    "corn": "Cooked Corn",
+    "cooked vegetables": "Vegetal",
+    "tomato sauce": "Vegetal",
+    "sulfur": "Cabbage",
+    "antiseptic": "Medicinal",
+    "chloroseptic": "Medicinal",
+    "mouthwash": "Medicinal",
+    "adhesive bandage": "Band-Aid",
+    "plaster": "Band-Aid",
+    "clove oil": "Clove",
+    "wet paper": "Papery",
+    "paper": "Papery",
+    "old": "Stale",
+    "sherry": "Stale",
+    "wet cardboard": "Cardboard",
+    "metal": "Metallic",
+    "coins": "Metallic",
+    "iron": "Metallic",
+    "blood": "Blood-like",
+    "canned": "Tinny",
+    "astringent": "Puckering",
+    "tannic": "Puckering",
+    "mouth puckering": "Puckering",
+    "boozy": "Hot",
+    "fusel": "Hot",
+    "alcoholic": "Hot",
+    "warming": "Hot",
+    "acetone": "Solvent-like",
+    "nail polish": "Solvent-like",
+    "paint thinner": "Solvent-like",
+    "plastic wrap": "Plastic",
+    "vinegar": "Sour",
+    "acidic": "Sour",
+    "lactic": "Sour",
+    "tangy": "Tart",
+}
+
+# Recipe parameters accepted by the analyzer: form field, label and unit
+recipe_parameters = [
+    ("boil_time", "Boil Time", "minutes"),
+    ("ferment_temp", "Fermentation Temperature", "°F"),
+    ("mash_temp", "Mash Temperature", "°F"),
+    ("mash_ph", "Mash pH", ""),
+    ("dissolved_oxygen", "Packaged Dissolved Oxygen", "ppb"),
+    ("pitch_rate", "Pitch Rate", "million cells/mL/°P"),
+]
+
+# Recipe analysis rules. Each bounds one parameter with "above", "at_least",
+# "below" and/or "at_most" and links to the defect in flavor_defects it puts
+# the beer at risk of; "issue" is the label shown when it differs from the
+# defect name.
+recipe_rules = [
+    {"parameter": "boil_time", "below": 60, "defect": "DMS (Dimethyl Sulfide)"},
+    {"parameter": "ferment_temp", "above": 70, "defect": "Alcoholic", "issue": "Alcoholic (Hot)"},
+    {"parameter": "mash_temp", "above": 170, "defect": "Astringency", "issue": "Astringency (Tannin Extraction)"},
+    {"parameter": "mash_ph", "above": 6.0, "defect": "Astringency", "issue": "Astringency (High pH)"},
+    {"parameter": "dissolved_oxygen", "above": 100, "defect": "Oxidation"},
+    {"parameter": "pitch_rate", "below": 0.75, "defect": "Diacetyl", "issue": "Diacetyl (Under-pitched)"},
+    {"parameter": "pitch_rate", "below": 0.75, "defect": "Alcoholic", "issue": "Alcoholic (Under-pitched)"},
+]
+
+# Lookup tables for the troubleshooting guide, built once per catalog
+class DefectIndex:
+    def __init__(self, defects, synonyms=None):
+        self.names = list(defects)
+        # lowercased off-flavor -> positions of the defects listing it
+        self.by_flavor = {}
+        # lowercased brewing stage -> positions of the defects in that stage
+        self.by_stage = {}
+        # lowercased category -> positions of the defects in it
+        self.by_category = {}
+        for position, details in enumerate(defects.values()):
+            for flavor in details.get("Off-Flavors", []):
+                self.by_flavor.setdefault(flavor.lower(), set()).add(position)
+            self.by_stage.setdefault(details.get("Brewing Stage", "").lower(), set()).add(position)
+            self.by_category.setdefault(str(details.get("Category", "")).lower(), set()).add(position)
+        # Free-text off-flavors -> the catalog's own terms
+        self.vocabulary = FlavorVocabulary(self.by_flavor, synonyms)
+
+    def stage_matches(self, stage):
+        # Stages are matched by substring, so check each distinct stage once
+        # instead of every defect.
+        matched = set()
+        for stage_text, positions in self.by_stage.items():
+            if stage in stage_text:
+                matched |= positions
+        return matched
+
+    # The catalog terms each entered off-flavor was read as
+    def resolve_flavors(self, off_flavor_list):
+        return {flavor: self.vocabulary.lookup(flavor) for flavor in off_flavor_list}
+
+    def flavor_matches(self, off_flavor_list):
+        matched = set()
+        for terms in self.resolve_flavors(off_flavor_list).values():
+            for term in terms:
+                matched |= self.by_flavor[term]
+        return matched
+
+    def match(self, stage, off_flavor_list):
+        # Same rules as a full scan: a defect matches when its stage contains
+        # `stage` and it lists any of `off_flavor_list`; an empty input
+        # matches everything. Names come back in catalog order.
+        if not stage and not off_flavor_list:
+            return list(self.names)
+        candidates = None
+        if stage:
+            candidates = self.stage_matches(stage)
+        if off_flavor_list:
+            flavors = self.flavor_matches(off_flavor_list)
+            candidates = flavors if candidates is None else candidates & flavors
+        return [self.names[position] for position in sorted(candidates)]
+
+    # match() for a list of (stage, off_flavor_list) reports at once. Panel
+    # sheets repeat a lot, so each distinct report is answered once, and each
+    # distinct stage is resolved once for the whole batch.
+    def match_batch(self, reports):
+        distinct = {}
+        keys = []
+        for stage, off_flavor_list in reports:
+            key = (stage, frozenset(off_flavor_list) if off_flavor_list else None)
+            keys.append(distinct.setdefault(key, len(distinct)))
+
+        stages = {}
+        answers = []
+        for stage, off_flavors in distinct:
+            if not stage and off_flavors is None:
+                answers.append(list(self.names))
+                continue
+            candidates = None
+            if stage:
+                if stage not in stages:
+                    stages[stage] = self.stage_matches(stage)
+                candidates = stages[stage]
+            if off_flavors is not None:
+                flavors = self.flavor_matches(off_flavors)
+                candidates = flavors if candidates is None else candidates & flavors
+            answers.append([self.names[position] for position in sorted(candidates)])
+        return [answers[key] for key in keys]
+
 # Troubleshooting HTML template
 troubleshooting_template = """
 <!DOCTYPE html>
@@ -146,13 +369,27 @@ troubleshooting_template = """
         <label for="off_flavors">Off-Flavors (comma-separated):</label>
         <input type="text" id="off_flavors" name="off_flavors" value="{{ off_flavors }}">
         <br>
+        <input type="checkbox" id="rank" name="rank" value="1"{% if rank %} checked{% endif %}>
+        <label for="rank">Rank the most likely causes of all of these together</label>
+        <br>
         <button type="submit">Troubleshoot</button>
     </form>
+    {% if readings %}
+    <ul>
+        {% for flavor, terms in readings %}
+        {% if terms %}
+        <li>Read "{{ flavor }}" as {{ ", ".join(terms) }}</li>
+        {% else %}
+        <li>No catalog off-flavor resembles "{{ flavor }}"</li>
+        {% endif %}
+        {% endfor %}
+    </ul>
+    {% endif %}
     {% if matches %}
     <h2>Matching Defects:</h2>
     <ul>
         {% for name, details in matches.items() %}
-        <li><a href="/defect/{{ name }}">{{ name }}</a>: {{ ", ".join(details['Off-Flavors']) }}</li>
+        <li><a href="/defect/{{ name }}">{{ name }}</a>: {{ ", ".join(details['Off-Flavors']) }}{% if name in scores %} ({{ "%.0f"|format(scores[name] * 100) }}% likely){% endif %}</li>
         {% endfor %}
     </ul>
     {% elif stage or off_flavors %}
@@ -163,162 +400,1082 @@ troubleshooting_template = """
 </html>
 """
 
+# Home page HTML template
+home_template = """
+<!DOCTYPE html>
+<html>
+<head><title>Beer Flavor Defects App</title></head>
+<body>
+    <h1>Beer Flavor Defects App</h1>
+    <nav>
+        <ul>
+            <li><a href="/defects">View All Defects</a></li>
+            <li><a href="/search">Search Defects</a></li>
+            <li><a href="/troubleshoot">Troubleshooting Guide</a></li>
+            <li><a href="/analyze">Analyze Recipe</a></li>
+            <li><a href="/panel">Sensory Panel Trends</a></li>
+            <li><a href="/export">Export Data to Excel</a></li>
+        </ul>
+    </nav>
+</body>
+</html>
+"""
+
+# All defects HTML template
+defects_template = """
+<!DOCTYPE html>
+<html>
+<head><title>All Defects</title></head>
+<body>
+    <h1>All Defects</h1>
+    <ul>
+        {% for name in defects.keys() %}
+        <li><a href="/defect/{{ name }}">{{ name }}</a></li>
+        {% endfor %}
+    </ul>
+    <a href="/">Back to Home</a>
+</body>
+</html>
+"""
+
+# Defect detail HTML template
+defect_template = """
+<!DOCTYPE html>
+<html>
+<head><title>{{ defect_name }}</title></head>
+<body>
+    <h1>{{ defect_name }}</h1>
+    <p><strong>Chemical Makeup:</strong> {{ defect['Chemical Makeup'] }}</p>
+    <p><strong>Brewing Stage:</strong> {{ defect['Brewing Stage'] }}</p>
+    <p><strong>Origins:</strong> {{ defect['Origins'] }}</p>
+    <h3>Solutions</h3>
+    <ul>
+        {% for solution in defect['Solutions'] %}
+        <li>{{ solution }}</li>
+        {% endfor %}
+    </ul>
+    <h3>Prevention</h3>
+    <ul>
+        {% for prevention in defect['Prevention'] %}
+        <li>{{ prevention }}</li>
+        {% endfor %}
+    </ul>
+    <a href="{{ defect['Learn More'] }}">Learn More</a>
+    <br><br>
+    <a href="/defects">Back to All Defects</a>
+</body>
+</html>
+"""
+
+# Search HTML template
+search_template = """
+<!DOCTYPE html>
+<html>
+<head><title>Search Defects</title></head>
+<body>
+    <h1>Search Defects</h1>
+    <form method="GET">
+        <label for="query">Search names, causes, off-flavors and fixes:</label>
+        <input type="text" id="query" name="query" value="{{ query }}">
+        <button type="submit">Search</button>
+    </form>
+    {% if results %}
+    <h2>Results:</h2>
+    <ol>
+        {% for result in results %}
+        <li>
+            <a href="/defect/{{ result.name }}">{{ result.name }}</a> ({{ "%.2f"|format(result.score) }})
+            <br>{{ result.snippet }}
+        </li>
+        {% endfor %}
+    </ol>
+    {% elif query %}
+    <p>No results found for "{{ query }}".</p>
+    {% endif %}
+    <a href="/">Back to Home</a>
+</body>
+</html>
+"""
+
+# Analyze recipe HTML template
+analyze_template = """
+<!DOCTYPE html>
+<html>
+<head><title>Analyze Recipe</title></head>
+<body>
+    <h1>Analyze Recipe</h1>
+    <form method="POST">
+        {% for field, label, unit in parameters %}
+        <label for="{{ field }}">{{ label }}{% if unit %} ({{ unit }}){% endif %}:</label>
+        <input type="number" step="any" id="{{ field }}" name="{{ field }}" value="{% if field in values %}{{ "%g"|format(values[field]) }}{% endif %}">
+        <br>
+        {% endfor %}
+        <button type="submit">Analyze</button>
+    </form>
+    {% if values %}
+    <h2>Analysis Results:</h2>
+    <ul>
+        {% for field, label, unit in parameters if field in values %}
+        <li><strong>{{ label }}:</strong> {{ "%g"|format(values[field]) }} {{ unit }}</li>
+        {% endfor %}
+        {% if potential_issues %}
+            <h3>Potential Issues:</h3>
+            <ul>
+                {% for issue, defect in potential_issues %}
+                <li>{% if defect %}<a href="/defect/{{ defect }}">{{ issue }}</a>{% else %}{{ issue }}{% endif %}</li>
+                {% endfor %}
+            </ul>
+        {% else %}
+            <p>No significant issues detected.</p>
+        {% endif %}
+    </ul>
+    {% endif %}
+    <a href="/">Back to Home</a>
+</body>
+</html>
+"""
+
+# Sensory panel trends HTML template
+panel_template = """
+<!DOCTYPE html>
+<html>
+<head><title>Sensory Panel Trends</title></head>
+<body>
+    <h1>Sensory Panel Trends</h1>
+    <p>Defects matched in tastings since {{ since }}.</p>
+    {% for title, dimensions, rows in sections %}
+    <h2>{{ title }}</h2>
+    {% if rows %}
+    <table>
+        <tr>{% for dimension in dimensions %}<th>{{ dimension|capitalize }}</th>{% endfor %}<th>Defect</th><th>Reports</th><th>Share of Tastings</th></tr>
+        {% for row in rows %}
+        <tr>
+            {% for dimension in dimensions %}<td>{{ row[dimension] }}</td>{% endfor %}
+            <td><a href="/defect/{{ row.defect }}">{{ row.defect }}</a></td>
+            <td>{{ row.reported }}</td>
+            <td>{{ "%.1f%%"|format(100 * row.reported / row.tastings) if row.tastings else "" }}</td>
+        </tr>
+        {% endfor %}
+    </table>
+    {% else %}
+    <p>No defects reported.</p>
+    {% endif %}
+    {% endfor %}
+    <a href="/">Back to Home</a>
+</body>
+</html>
+"""
+
+# Templates are compiled once here rather than on every request
+templates = {
+    "troubleshooting": app.jinja_env.from_string(troubleshooting_template),
+    "home": app.jinja_env.from_string(home_template),
+    "defects": app.jinja_env.from_string(defects_template),
+    "defect": app.jinja_env.from_string(defect_template),
+    "search": app.jinja_env.from_string(search_template),
+    "analyze": app.jinja_env.from_string(analyze_template),
+    "panel": app.jinja_env.from_string(panel_template),
+}
+
+def render_page(template_name, **context):
+    app.update_template_context(context)
+    return templates[template_name].render(context)
+
+# A page rendered for the current request, timed as a span. Catalog pages
+# are rendered ahead of any request with render_page() instead.
+def render(template_name, **context):
+    with metrics.span(f"render.{template_name}"):
+        return render_page(template_name, **context)
+
+# This module's contents, templates included, identify how pages are
+# rendered: a deploy that changes them changes every page's validators too
+with open(__file__, "rb") as app_source:
+    app_build = hashlib.sha256(app_source.read()).hexdigest()[:12]
+app_modified = os.path.getmtime(__file__)
+
+# Seconds browsers and proxies may reuse a catalog page before revalidating
+page_max_age = int(os.environ.get("BEER_DEFECTS_PAGE_MAX_AGE", "60"))
+
+# Content codings pre-rendered pages can be sent with, most preferred first.
+# Brotli needs the optional `brotli` package.
+page_encodings = (["br"] if brotli is not None else []) + ["gzip", "identity"]
+
+# Brotli at quality 11 takes milliseconds a page, which the two list pages
+# are worth. The pages of single defects, one per defect in the catalog,
+# use quality 5: some 15% larger, in under a tenth of the time.
+def encode_page(body, encoding, quality=11):
+    if encoding == "br":
+        return brotli.compress(body, quality=quality)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    return body
+
+# Serve a pre-rendered catalog page with validators and the best encoding
+# the client accepts. Everything on these pages comes from the catalog and
+# this module, so the catalog version and app build make a strong ETag.
+def page_response(current, key, body, mimetype="text/html"):
+    encoding = request.accept_encodings.best_match(page_encodings, default="identity")
+    etag = f"{current.version}-{app_build}"
+    if encoding != "identity":
+        etag = f"{etag}-{encoding}"
+    if not is_resource_modified(request.environ, etag=etag, last_modified=current.modified):
+        response = Response(status=304)
+    else:
+        response = Response(current.encoded_page(key, body, encoding), mimetype=mimetype)
+        if encoding != "identity":
+            response.content_encoding = encoding
+    response.set_etag(etag)
+    response.last_modified = current.modified
+    response.cache_control.public = True
+    response.cache_control.max_age = page_max_age
+    response.vary.add("Accept-Encoding")
+    return response
+
+# Number of results shown by /search
+search_limit = 20
+
+# Results of repeated troubleshooting and search queries, kept per catalog
+# version: up to BEER_DEFECTS_QUERY_CACHE_SIZE of them (0 turns the cache
+# off) for BEER_DEFECTS_QUERY_CACHE_TTL seconds. BEER_DEFECTS_QUERY_CACHE_DB
+# names a SQLite file through which the gunicorn workers share results.
+query_cache = QueryCache(
+    max_entries=int(os.environ.get("BEER_DEFECTS_QUERY_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("BEER_DEFECTS_QUERY_CACHE_TTL", "300")),
+    path=os.environ.get("BEER_DEFECTS_QUERY_CACHE_DB") or None,
+    metrics=metrics,
+)
+
+# Most reports accepted by one /api/troubleshoot/batch request
+batch_limit = 50_000
+
+# Export formats and their MIME types
+export_formats = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# The catalog serialized for /export, in chunks of bytes. Formats in
+# export_writers are written a defect at a time; Parquet, being columnar,
+# still goes through a whole DataFrame.
+def export_chunks(defects, export_format):
+    if export_format not in export_formats:
+        raise ValueError(f"Unknown export format: {export_format}")
+    if export_format in export_writers:
+        return export_writers[export_format](defects)
+    import pandas as pd
+
+    df = pd.DataFrame.from_dict(defects, orient='index')
+    buffer = io.BytesIO()
+    df.to_parquet(buffer)
+    return [buffer.getvalue()]
+
+# A whole export in memory
+def build_export(defects, export_format):
+    return b"".join(export_chunks(defects, export_format))
+
+# Everything derived from one version of the defects catalog. Routes read it
+# through `catalog`, which refresh_catalog() replaces in a single assignment.
+class Catalog:
+    def __init__(self, defects, modified=None):
+        self.defects = defects
+        self.version = catalog_version(defects)
+        # Last-Modified for the catalog pages, in whole seconds as HTTP sends
+        # it: when the catalog or the app last changed
+        self.modified = datetime.fromtimestamp(int(max(modified or time.time(), app_modified)), timezone.utc)
+        self.index = DefectIndex(defects, flavor_synonyms)
+
+        # Pages that only depend on the catalog are rendered up front
+        with app.app_context():
+            self.home_page = render_page("home").encode("utf-8")
+            self.defects_page = render_page("defects", defects=defects).encode("utf-8")
+            self.defect_pages = {
+                name: render_page("defect", defect_name=name, defect=defect).encode("utf-8")
+                for name, defect in defects.items()
+            }
+
+        # Compressed copies of those pages and of the API's defect JSON, made
+        # by warm() or else on first request for each page and encoding
+        self.encoded_pages = {}
+
+        # Exports that aren't streamed (XLSX, Parquet), made on first request
+        # for each format and kept in temporary files
+        self.exports = {}
+        self.export_locks = {export_format: threading.Lock() for export_format in export_formats}
+
+        # (category, stage) -> positions for /api/defects filters
+        self.api_filters = {}
+
+    def encoded_page(self, key, body, encoding):
+        if encoding == "identity":
+            return body
+        data = self.encoded_pages.get((key, encoding))
+        if data is None:
+            data = encode_page(body, encoding, quality=11 if key in ("home", "defects") else 5)
+            self.encoded_pages[(key, encoding)] = data
+        return data
+
+    # Build what is otherwise made on first use by searches, lookups, the
+    # API and the compressed pages, so no request waits for it
+    def warm(self):
+        self.search_index
+        self.ranker
+        self.defect_json
+        self.fields
+        for encoding in page_encodings:
+            self.encoded_page("home", self.home_page, encoding)
+            self.encoded_page("defects", self.defects_page, encoding)
+            for name, page in self.defect_pages.items():
+                self.encoded_page(("defect", name), page, encoding)
+            for name, serialized in self.defect_json.items():
+                self.encoded_page(("json", name), serialized[0], encoding)
+
+    # Built on the first search against this version
+    @cached_property
+    def search_index(self):
+        return SearchIndex(self.defects)
+
+    # Built on the first ranked troubleshooting lookup against this version
+    @cached_property
+    def ranker(self):
+        return DefectRanker(self.index)
+
+    # Each defect as JSON for the API, serialized once per version: the whole
+    # object, and each field as a `"key":value` fragment for requests that
+    # ask for some fields only
+    @cached_property
+    def defect_json(self):
+        serialized = {}
+        for name, details in self.defects.items():
+            fragments = {"name": json.dumps("name") + ":" + json.dumps(name, ensure_ascii=False)}
+            for field, value in details.items():
+                fragments[field] = json.dumps(field, ensure_ascii=False) + ":" + json.dumps(value, ensure_ascii=False)
+            fragments = {field: fragment.encode("utf-8") for field, fragment in fragments.items()}
+            serialized[name] = (b"{" + b",".join(fragments.values()) + b"}", fragments)
+        return serialized
+
+    # Every field name used in the catalog
+    @cached_property
+    def fields(self):
+        found = {"name": None}
+        for details in self.defects.values():
+            found.update(dict.fromkeys(details))
+        return list(found)
+
+    # Positions, in catalog order, of the defects in a category and/or
+    # brewing stage (compared case-insensitively); None means any. Kept per
+    # filter, which can only take values from the catalog.
+    def filtered_positions(self, category=None, stage=None):
+        key = (category, stage)
+        positions = self.api_filters.get(key)
+        if positions is None:
+            found = None
+            if category is not None:
+                found = self.index.by_category.get(category, set())
+            if stage is not None:
+                in_stage = self.index.by_stage.get(stage, set())
+                found = in_stage if found is None else found & in_stage
+            positions = list(range(len(self.index.names))) if found is None else sorted(found)
+            if positions or found is None:
+                self.api_filters[key] = positions
+        return positions
+
+    # A temporary file holding the whole export. Concurrent first requests
+    # wait for one build rather than each making their own.
+    def export(self, export_format):
+        with self.export_locks[export_format]:
+            output = self.exports.get(export_format)
+            if output is None:
+                output = tempfile.TemporaryFile()
+                try:
+                    with metrics.span(f"export.{export_format}"):
+                        for chunk in export_chunks(self.defects, export_format):
+                            output.write(chunk)
+                    output.flush()
+                except BaseException:
+                    output.close()
+                    raise
+                self.exports[export_format] = output
+            return output
+
+# Where the catalog is loaded from: an .xlsx workbook in the /export layout
+# or a SQLite database with a `defects` table. Without one the built-in
+# `flavor_defects` is served.
+catalog_source = os.environ.get("BEER_DEFECTS_CATALOG")
+
+# Seconds between checks of the catalog source for changes
+catalog_check_interval = float(os.environ.get("BEER_DEFECTS_CATALOG_CHECK_INTERVAL", "5"))
+
+# Set BEER_DEFECTS_COMPACT_CATALOG=1 to hold the defects as a CompactCatalog;
+# with a catalog source that is a snapshot file every worker maps read-only.
+# Only the defect data is shared: the pre-rendered pages and indexes below
+# are built in each worker either way.
+use_compact_catalog = os.environ.get("BEER_DEFECTS_COMPACT_CATALOG", "0") == "1"
+
+catalog_lock = threading.Lock()
+catalog_source_stamp = None
+catalog_checked_at = 0.0
+catalog_reload_lock = threading.Lock()
+catalog_reload_thread = None
+
+# The defects of the catalog source. Its stamp is only recorded once they
+# have loaded, so a source that fails to load is tried again.
+def load_source_defects():
+    global catalog_source_stamp
+    stamp = source_stamp(catalog_source)
+    defects = load_defects(catalog_source, compact=use_compact_catalog)
+    catalog_source_stamp = stamp
+    return defects
+
+# `defects` in the form this process serves: as given, or compacted
+def served_defects(defects):
+    if use_compact_catalog and not isinstance(defects, CompactCatalog):
+        return CompactCatalog.from_defects(defects, catalog_version(defects))
+    return defects
+
+if catalog_source:
+    catalog = Catalog(load_source_defects(), modified=catalog_source_stamp[0] / 1e9)
+else:
+    catalog = Catalog(served_defects(flavor_defects), modified=os.path.getmtime(__file__))
+
+# Recipe rules compiled for lookup by parameter
+recipe_rule_index = RuleIndex(recipe_rules)
+
+# Rebuild the derived catalog data after `flavor_defects` (or a replacement
+# dict) has changed. Nothing is rebuilt when the contents are the same. The
+# new catalog is built off to the side, warmed first if `warm` is set, and
+# swapped in with one assignment, so requests in flight keep the version
+# they started with.
+def refresh_catalog(defects=None, modified=None, warm=False):
+    global catalog
+    if defects is None:
+        defects = flavor_defects
+    with catalog_lock:
+        if catalog_version(defects) != catalog.version:
+            replacement = Catalog(served_defects(defects), modified)
+            if warm:
+                replacement.warm()
+            catalog = replacement
+        return catalog
+
+# Re-read the catalog source and swap in its contents
+def reload_catalog(warm=False):
+    if not catalog_source:
+        return refresh_catalog(warm=warm)
+    defects = load_source_defects()
+    return refresh_catalog(defects, modified=catalog_source_stamp[0] / 1e9, warm=warm)
+
+# Build the parts of the catalog that are otherwise made on first use, and
+# optionally import the libraries behind /export and /analyze/bulk. The
+# gunicorn config runs this in the master when preloading so every worker
+# shares the result copy-on-write.
+def warm_catalog(heavy_imports=False):
+    catalog.warm()
+    if heavy_imports:
+        import openpyxl  # noqa: F401
+        import pandas  # noqa: F401
+
+# Whether the catalog source is due to be checked for changes, marking it
+# checked if so
+def catalog_check_due():
+    global catalog_checked_at
+    if not catalog_source:
+        return False
+    now = time.monotonic()
+    if now - catalog_checked_at < catalog_check_interval:
+        return False
+    catalog_checked_at = now
+    return True
+
+# Reload the catalog if its source has changed
+def reload_changed_catalog(warm=False):
+    try:
+        changed = source_stamp(catalog_source) != catalog_source_stamp
+    except OSError:
+        # Keep serving the loaded catalog while the source is being replaced
+        return
+    if changed:
+        try:
+            reload_catalog(warm=warm)
+        except Exception:
+            # Most likely a source caught halfway through being written. The
+            # loaded catalog is served until a later check loads the source.
+            app.logger.exception("Could not reload the catalog from %s", catalog_source)
+
+# Check the catalog source, and rebuild the catalog if it changed, on a
+# thread of its own. Pre-rendering a large catalog takes longer than a
+# request may, so requests keep getting the loaded version until the new one
+# is built, warmed and swapped in. One reload runs at a time per process.
+def start_catalog_reload():
+    global catalog_reload_thread
+    with catalog_reload_lock:
+        if catalog_reload_thread is not None and catalog_reload_thread.is_alive():
+            return catalog_reload_thread
+        catalog_reload_thread = threading.Thread(
+            target=reload_changed_catalog, kwargs={"warm": True}, name="beer-defects-catalog-reload", daemon=True
+        )
+        catalog_reload_thread.start()
+        return catalog_reload_thread
+
+# Each worker notices an edited catalog source on its own, so a change
+# reaches every worker without restarting any of them.
+@app.before_request
+def check_catalog_source():
+    if catalog_check_due():
+        start_catalog_reload()
+
+# Label the request with its route for RequestMetrics
+@app.before_request
+def note_request_route():
+    request.environ["beer_defects.route"] = request.url_rule.rule if request.url_rule else "<unmatched>"
+
+# Times each request from its arrival until its response is closed, so a
+# streamed body counts in full and a request that fails with an unhandled
+# exception still counts, as a 500.
+class RequestMetrics:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if not metrics.enabled:
+            return self.wsgi_app(environ, start_response)
+        started = time.perf_counter()
+        status = []
+
+        def timed_start_response(status_line, headers, exc_info=None):
+            status[:] = [status_line]
+            return start_response(status_line, headers, exc_info)
+
+        def record():
+            code = int(status[0].split(" ", 1)[0]) if status else 500
+            route = environ.get("beer_defects.route", "<unmatched>")
+            metrics.observe_request(route, environ["REQUEST_METHOD"], code, time.perf_counter() - started)
+
+        try:
+            body = self.wsgi_app(environ, timed_start_response)
+        except BaseException:
+            status.clear()
+            record()
+            raise
+        return ClosingIterator(body, record)
+
+app.wsgi_app = RequestMetrics(app.wsgi_app)
+
+# Prometheus metrics for every worker
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 # Home page
 @app.route('/')
 def home():
-    return render_template_string("""
-    <!DOCTYPE html>
-    <html>
-    <head><title>Beer Flavor Defects App</title></head>
-    <body>
-        <h1>Beer Flavor Defects App</h1>
-        <nav>
-            <ul>
-                <li><a href="/defects">View All Defects</a></li>
-                <li><a href="/search">Search Defects</a></li>
-                <li><a href="/troubleshoot">Troubleshooting Guide</a></li>
- 		<li><a href="/analyze">Analyze Recipe</a></li>
-                <li><a href="/export">Export Data to Excel</a></li>
-            </ul>
-        </nav>
-    </body>
-    </html>
-    """)
+    current = catalog
+    return page_response(current, "home", current.home_page)
+
 # View All Defects
 @app.route('/defects')
 def list_defects():
-    return render_template_string("""
-    <!DOCTYPE html>
-    <html>
-    <head><title>All Defects</title></head>
-    <body>
-        <h1>All Defects</h1>
-        <ul>
-            {% for name in defects.keys() %}
-            <li><a href="/defect/{{ name }}">{{ name }}</a></li>
-            {% endfor %}
-        </ul>
-        <a href="/">Back to Home</a>
-    </body>
-    </html>
-    """, defects=flavor_defects)
+    current = catalog
+    return page_response(current, "defects", current.defects_page)
 
 @app.route('/defect/<name>')
 def defect_detail(name):
-    defect = flavor_defects.get(name)
-    if defect:
-        return render_template_string("""
-        <!DOCTYPE html>
-        <html>
-        <head><title>{{ defect_name }}</title></head>
-        <body>
-            <h1>{{ defect_name }}</h1>
-            <p><strong>Chemical Makeup:</strong> {{ defect['Chemical Makeup'] }}</p>
-            <p><strong>Brewing Stage:</strong> {{ defect['Brewing Stage'] }}</p>
-            <p><strong>Origins:</strong> {{ defect['Origins'] }}</p>
-            <h3>Solutions</h3>
-            <ul>
-                {% for solution in defect['Solutions'] %}
-                <li>{{ solution }}</li>
-                {% endfor %}
-            </ul>
-            <h3>Prevention</h3>
-            <ul>
-                {% for prevention in defect['Prevention'] %}
-                <li>{{ prevention }}</li>
-                {% endfor %}
-            </ul>
-            <a href="{{ defect['Learn More'] }}">Learn More</a>
-            <br><br>
-            <a href="/defects">Back to All Defects</a>
-        </body>
-        </html>
-        """, defect_name=name, defect=defect)
+    current = catalog
+    page = current.defect_pages.get(name)
+    if page:
+        return page_response(current, ("defect", name), page)
     else:
         return "Defect not found", 404
 
+# Defects per /api/defects page by default, and at most
+api_page_size = 100
+api_max_page_size = 1000
+
+def encode_cursor(version, position):
+    return base64.urlsafe_b64encode(f"{version}:{position}".encode("ascii")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        version, position = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii").split(":")
+        return version, int(position)
+    except (ValueError, UnicodeError):
+        raise ValueError("invalid cursor")
+
+# The catalog as JSON, a page at a time. ?limit= sets the page size,
+# ?cursor= continues from the "next" of the previous page, ?fields= picks
+# fields (the name is always included), and ?category= / ?stage= keep the
+# defects in that Category / Brewing Stage. A cursor is only valid for the
+# catalog version it was made from; after a reload the listing must start
+# over.
+@app.route('/api/defects')
+def api_defects():
+    current = catalog
+    try:
+        limit = int(request.args.get('limit', api_page_size))
+        cursor = request.args.get('cursor')
+        start = 0
+        if cursor:
+            version, start = decode_cursor(cursor)
+            if version != current.version:
+                return jsonify({"error": "the catalog changed since this listing started; start again without a cursor"}), 409
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    if not 0 < limit <= api_max_page_size:
+        return jsonify({"error": f"limit must be between 1 and {api_max_page_size}"}), 400
+
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(",") if field.strip()]
+        unknown = [field for field in fields if field not in current.fields]
+        if unknown:
+            return jsonify({"error": f"unknown fields: {', '.join(unknown)}"}), 400
+        fields = ["name"] + [field for field in dict.fromkeys(fields) if field != "name"]
+    category = request.args.get('category', '').strip().lower() or None
+    stage = request.args.get('stage', '').strip().lower() or None
+
+    positions = current.filtered_positions(category, stage)
+    first = bisect_left(positions, start)
+    page = positions[first:first + limit]
+    names = current.index.names
+    serialized = current.defect_json
+    items = []
+    for position in page:
+        whole, fragments = serialized[names[position]]
+        if fields is None:
+            items.append(whole)
+        else:
+            items.append(b"{" + b",".join(fragments[field] for field in fields if field in fragments) + b"}")
+    following = first + limit < len(positions)
+    next_cursor = encode_cursor(current.version, positions[first + limit]) if following else None
+    body = b"".join([
+        b'{"defects":[', b",".join(items), b'],"next":', json.dumps(next_cursor).encode("ascii"),
+        b',"total":', str(len(positions)).encode("ascii"), b"}",
+    ])
+    return Response(body, mimetype="application/json")
+
+@app.route('/api/defects/<name>')
+def api_defect(name):
+    current = catalog
+    serialized = current.defect_json.get(name)
+    if serialized is None:
+        return jsonify({"error": "Defect not found"}), 404
+    return page_response(current, ("json", name), serialized[0], mimetype="application/json")
+
 # Troubleshooting guide
 @app.route('/troubleshoot', methods=['GET', 'POST'])
 def troubleshoot():
     stage = ""
     off_flavors = ""
+    rank = False
     matches = {}
+    scores = {}
+    readings = []
     if request.method == 'POST':
         stage = request.form.get('stage', '').strip().lower()
         off_flavors = request.form.get('off_flavors', '').strip().lower()
         off_flavor_list = [flavor.strip() for flavor in off_flavors.split(",")] if off_flavors else []
+        rank = bool(request.form.get('rank'))
+
+        current = catalog
+        if rank:
+            # The few defects that best explain all inputs together, best first
+            with metrics.span("troubleshoot.rank"):
+                ranked, resolved = ranked_defects(current, stage, off_flavor_list, rank_limit)
+            for name, score in ranked:
+                matches[name] = current.defects[name]
+                scores[name] = score
+        else:
+            with metrics.span("troubleshoot.match"):
+                names, resolved = matched_defects(current, stage, off_flavor_list)
+            for name in names:
+                matches[name] = current.defects[name]
+        # Show how entries that aren't catalog terms were understood
+        for flavor in dict.fromkeys(off_flavor_list):
+            if flavor and resolved[flavor] != [flavor]:
+                readings.append((flavor, resolved[flavor]))
+
+    return render(
+        "troubleshooting", stage=stage, off_flavors=off_flavors, rank=rank, matches=matches, scores=scores, readings=readings
+    )
+
+# Troubleshooting results through the query cache, with what each entered
+# off-flavor was read as (flavor -> catalog terms). Cached values may have
+# been through JSON, so pairs can come back as lists.
+def matched_defects(current, stage, off_flavor_list):
+    def compute():
+        return current.index.match(stage, off_flavor_list), current.index.resolve_flavors(off_flavor_list)
+
+    return query_cache.get("match", current.version, troubleshoot_key("match", stage, off_flavor_list), compute)
+
+def ranked_defects(current, stage, off_flavor_list, limit):
+    def compute():
+        return current.ranker.rank(stage, off_flavor_list, limit), current.index.resolve_flavors(off_flavor_list)
+
+    return query_cache.get("rank", current.version, troubleshoot_key("rank", stage, off_flavor_list, limit), compute)
+
+# Full-text search
+@app.route('/search', methods=['GET', 'POST'])
+def search_defects():
+    query = request.values.get('query', '').strip()
+    results = []
+    if query:
+        current = catalog
+
+        def compute():
+            index = current.search_index
+            return [
+                (name, score, str(index.snippet(name, query)))
+                for name, score in index.search(query, limit=search_limit)
+            ]
+
+        with metrics.span("search.query"):
+            found = query_cache.get("search", current.version, json.dumps(["search", query]), compute)
+        for name, score, snippet in found:
+            results.append({"name": name, "score": score, "snippet": Markup(snippet)})
+    return render("search", query=query, results=results)
+
+# Normalize one batch report the same way troubleshoot() reads its form.
+# Off-flavors may be a list or a comma-separated string.
+def parse_report(report):
+    if not isinstance(report, dict):
+        raise ValueError("each report must be an object")
+    stage = str(report.get("stage") or "").strip().lower()
+    off_flavors = report.get("off_flavors") or []
+    if isinstance(off_flavors, str):
+        off_flavors = off_flavors.split(",") if off_flavors.strip() else []
+    elif not isinstance(off_flavors, list):
+        raise ValueError("off_flavors must be a list or a comma-separated string")
+    return stage, [str(flavor).strip().lower() for flavor in off_flavors]
+
+# Read a batch of objects as a JSON list (or {"reports": [...]}) or as NDJSON
+def read_report_objects():
+    body = request.get_data(as_text=True)
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        reports = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        reports = json.loads(body)
+        if isinstance(reports, dict):
+            reports = reports.get("reports")
+    if not isinstance(reports, list):
+        raise ValueError("expected a list of reports")
+    return reports
+
+def read_reports():
+    return [parse_report(report) for report in read_report_objects()]
+
+# Troubleshoot many sensory reports in one request
+@app.route('/api/troubleshoot/batch', methods=['POST'])
+def troubleshoot_batch():
+    try:
+        reports = read_reports()
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    if len(reports) > batch_limit:
+        return jsonify({"error": f"at most {batch_limit} reports per request"}), 413
+
+    with metrics.span("troubleshoot.batch"):
+        matches = catalog.index.match_batch(reports)
+    return jsonify({
+        "results": [
+            {"stage": stage, "off_flavors": off_flavor_list, "matches": names}
+            for (stage, off_flavor_list), names in zip(reports, matches)
+        ]
+    })
 
-        for name, details in flavor_defects.items():
-            matches_stage = not stage or stage in details.get("Brewing Stage", "").lower()
-            matches_flavor = not off_flavor_list or any(flavor in map(str.lower, details.get("Off-Flavors", [])) for flavor in off_flavor_list)
+# The defects that best explain one sensory report, best first, with their
+# probabilities. Takes a report object like the batch API, plus an optional
+# "limit".
+@app.route('/api/troubleshoot/rank', methods=['POST'])
+def troubleshoot_rank():
+    try:
+        report = json.loads(request.get_data(as_text=True))
+        stage, off_flavor_list = parse_report(report)
+        limit = int(report.get("limit", rank_limit))
+    except (TypeError, ValueError) as error:
+        return jsonify({"error": str(error)}), 400
+    if not 0 < limit <= search_limit:
+        return jsonify({"error": f"limit must be between 1 and {search_limit}"}), 400
 
-            if matches_stage and matches_flavor:
-                matches[name] = details
+    current = catalog
+    with metrics.span("troubleshoot.rank"):
+        ranked, resolved = ranked_defects(current, stage, off_flavor_list, limit)
+    return jsonify({
+        "stage": stage,
+        "off_flavors": off_flavor_list,
+        "readings": {flavor: resolved[flavor] for flavor in off_flavor_list},
+        "results": [{"name": name, "score": score} for name, score in ranked],
+    })
 
-    return render_template_string(troubleshooting_template, stage=stage, off_flavors=off_flavors, matches=matches)
+# Sensory panel rollups, kept in BEER_DEFECTS_PANEL_DB, by default
+# panel.sqlite in the app's instance folder, Flask's place for data that
+# belongs to one deployment rather than to the source. Opened on first use
+# so importing the app never writes.
+panel_path = os.environ.get("BEER_DEFECTS_PANEL_DB") or os.path.join(app.instance_path, "panel.sqlite")
+panel_store = None
+
+# Days shown on the panel trends page
+panel_days = 30
+
+def get_panel_store():
+    global panel_store
+    if panel_store is None:
+        os.makedirs(os.path.dirname(os.path.abspath(panel_path)), exist_ok=True)
+        panel_store = PanelStore(panel_path)
+    return panel_store
+
+# Record tasting sheets: report objects as the batch API takes them, plus an
+# optional "date", "beer" and "line". Each tasting is matched like a
+# troubleshooting lookup and added to the per day/beer/line defect counts.
+@app.route('/api/panel/tastings', methods=['POST'])
+def ingest_tastings():
+    try:
+        records = read_report_objects()
+        if len(records) > batch_limit:
+            return jsonify({"error": f"at most {batch_limit} tastings per request"}), 413
+        parsed = [(record,) + parse_report(record) for record in records]
+        with metrics.span("panel.ingest"):
+            result = get_panel_store().ingest(parsed, catalog.index.match_batch)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    return jsonify(result)
+
+# Defect counts from the rollups, grouped by ?by=day,beer,line (any of
+# them, or none for totals), optionally ?since=YYYY-MM-DD and ?defect=name
+@app.route('/api/panel/rollups')
+def panel_rollups():
+    dimensions = tuple(dimension.strip() for dimension in request.args.get('by', 'day').split(",") if dimension.strip())
+    try:
+        rows = get_panel_store().rollup(
+            dimensions, since=request.args.get('since') or None, defect=request.args.get('defect') or None
+        )
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    return jsonify({"rollups": rows})
+
+# Which defects the panel has been finding lately
+@app.route('/panel')
+def panel_trends():
+    since = (datetime.now(timezone.utc) - timedelta(days=panel_days - 1)).date().isoformat()
+    store = get_panel_store()
+    sections = [
+        (title, dimensions, store.rollup(dimensions, since=since))
+        for title, dimensions in [("All Beers", ()), ("By Beer", ("beer",)), ("By Line", ("line",)), ("By Day", ("day",))]
+    ]
+    return render("panel", since=since, sections=sections)
 
 # Analyze Recipe
 @app.route('/analyze', methods=['GET', 'POST'])
 def analyze_recipe():
-    boil_time = ferment_temp = None
+    values = {}
     potential_issues = []
     if request.method == 'POST':
-        boil_time = int(request.form.get('boil_time', 0))
-        ferment_temp = float(request.form.get('ferment_temp', 0))
-        
-        # Analyze the boil time and fermentation temperature
-        if boil_time < 60:
-            potential_issues.append("DMS (Dimethyl Sulfide)")
-        if ferment_temp > 70:
-            potential_issues.append("Alcoholic (Hot)")
-    
-    return render_template_string("""
-    <!DOCTYPE html>
-    <html>
-    <head><title>Analyze Recipe</title></head>
-    <body>
-        <h1>Analyze Recipe</h1>
-        <form method="POST">
-            <label for="boil_time">Boil Time (minutes):</label>
-            <input type="number" id="boil_time" name="boil_time">
-            <br>
-            <label for="ferment_temp">Fermentation Temperature (°F):</label>
-            <input type="number" id="ferment_temp" name="ferment_temp">
-            <br>
-            <button type="submit">Analyze</button>
-        </form>
-        {% if boil_time and ferment_temp %}
-        <h2>Analysis Results:</h2>
-        <ul>
-            <li><strong>Boil Time:</strong> {{ boil_time }} minutes</li>
-            <li><strong>Fermentation Temperature:</strong> {{ ferment_temp }}°F</li>
-            {% if potential_issues %}
-                <h3>Potential Issues:</h3>
-                <ul>
-                    {% for issue in potential_issues %}
-                    <li>{{ issue }}</li>
-                    {% endfor %}
-                </ul>
-            {% else %}
-                <p>No significant issues detected.</p>
-            {% endif %}
-        </ul>
-        {% endif %}
-        <a href="/">Back to Home</a>
-    </body>
-    </html>
-    """, boil_time=boil_time, ferment_temp=ferment_temp, potential_issues=potential_issues)
+        for field, _, _ in recipe_parameters:
+            value = request.form.get(field, '').strip()
+            if value:
+                try:
+                    values[field] = parse_recipe_value(value)
+                except ValueError:
+                    return f"Invalid value for {field}", 400
+
+        # Check the entered values against the recipe rules
+        current = catalog
+        for rule in recipe_rule_index.evaluate(values):
+            defect = rule["defect"] if rule["defect"] in current.defects else None
+            potential_issues.append((rule_issue(rule), defect))
+
+    return render("analyze", parameters=recipe_parameters, values=values, potential_issues=potential_issues)
+
+# Analyze a whole CSV or Parquet batch log uploaded as the "batches" file
+@app.route('/analyze/bulk', methods=['POST'])
+def analyze_bulk():
+    upload = request.files.get('batches')
+    if upload is None:
+        return jsonify({"error": "upload a batch log as the 'batches' file"}), 400
+    file_format = "parquet" if upload.filename.lower().endswith(".parquet") else "csv"
+    try:
+        with metrics.span("analyze.bulk"):
+            result = bulk_analysis(upload.stream, file_format)
+    except ImportError:
+        return jsonify({"error": f"{file_format} uploads are not available on this server"}), 501
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    return jsonify(result)
+
+def bulk_analysis(stream, file_format):
+    rows, flagged, counts, issues = analyze_batch_log(stream, file_format, recipe_rule_index)
+    return {
+        "rows": rows,
+        "flagged": flagged,
+        "counts": counts,
+        "issues": issues.to_dict(orient="records"),
+    }
+
+# Check a fermentation sensor log sent as the request body: CSV, or JSON
+# lines with an application/x-ndjson content type. The body is read as it
+# arrives and findings stream back as NDJSON, followed by a summary line per
+# vessel, so logs of any size pass through in bounded memory.
+@app.route('/analyze/sensors', methods=['POST'])
+def analyze_sensors():
+    file_format = "jsonl" if request.mimetype in ("application/x-ndjson", "application/jsonl") else "csv"
+    # Problems with the log's layout show up in its first chunk and can
+    # still be answered with a status code; the rest is analyzed as the
+    # response is sent
+    try:
+        frames = open_sensor_log(request.stream, file_format)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    def generate():
+        with metrics.span("analyze.sensors"):
+            try:
+                for line in analyze_sensor_frames(frames):
+                    yield json.dumps(line) + "\n"
+            except ValueError as error:
+                yield json.dumps({"error": str(error)}) + "\n"
 
-# Export defects to Excel
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# Export defects to Excel, or to ?format=csv|json|ndjson|parquet. CSV and
+# JSON are streamed as they are written; XLSX and Parquet are built once per
+# catalog version and revalidated with an ETag.
 @app.route('/export')
 def export_defects():
-    # Convert the defects dictionary to a pandas DataFrame
-    df = pd.DataFrame.from_dict(flavor_defects, orient='index')
-    filename = "beer_defects.xlsx"
-    df.to_excel(filename)
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in export_formats:
+        return "Unsupported export format", 400
+    current = catalog
+    filename = f"beer_defects.{export_format}"
+    if export_format not in streamed_formats:
+        try:
+            output = current.export(export_format)
+        except ImportError:
+            # Parquet needs pyarrow (or fastparquet), which is optional
+            return f"{export_format} export is not available on this server", 501
+        response = Response(file_chunks(output), mimetype=export_formats[export_format])
+        response.content_length = os.fstat(output.fileno()).st_size
+        response.set_etag(f"{current.version}-{app_build}-{export_format}")
+        response.last_modified = current.modified
+        response.headers.set("Content-Disposition", "attachment", filename=filename)
+        return response.make_conditional(request)
+
+    chunks = export_chunks(current.defects, export_format)
+
+    def generate():
+        with metrics.span(f"export.{export_format}"):
+            yield from chunks
+
+    response = Response(generate(), mimetype=export_formats[export_format])
+    response.headers.set("Content-Disposition", "attachment", filename=filename)
+    return response
+
+# The contents of a file shared between requests, read at explicit offsets
+# so concurrent downloads don't move each other's position
+def file_chunks(output, chunk_size=64 * 1024):
+    offset = 0
+    while True:
+        chunk = os.pread(output.fileno(), chunk_size, offset)
+        if not chunk:
+            return
+        offset += len(chunk)
+        yield chunk
+
+# Background jobs for exports and bulk analyses too slow to wait for. Job
+# status and results live in BEER_DEFECTS_JOBS_DIR, shared by all workers;
+# each worker runs up to BEER_DEFECTS_JOB_WORKERS jobs at a time in its own
+# process pool, so a server with N workers runs up to N times that many.
+# Under gunicorn, an unset BEER_DEFECTS_JOB_WORKERS is replaced by each
+# worker's share of the CPUs (see gunicorn.conf.py).
+job_runner = JobRunner(
+    os.environ.get("BEER_DEFECTS_JOBS_DIR") or os.path.join(tempfile.gettempdir(), "beer_defects_jobs"),
+    max_workers=int(os.environ.get("BEER_DEFECTS_JOB_WORKERS", "2")),
+    metrics=metrics,
+)
+
+# Job functions run in the pool processes and return (data, mimetype,
+# download name)
+def export_job(defects, export_format):
+    return export_chunks(defects, export_format), export_formats[export_format], f"beer_defects.{export_format}"
+
+def bulk_analysis_job(data, file_format):
+    result = bulk_analysis(io.BytesIO(data), file_format)
+    return json.dumps(result).encode("utf-8"), "application/json", "bulk_analysis.json"
+
+def job_response(status, code=200):
+    job = status["id"]
+    response = jsonify(dict(status, status_url=f"/jobs/{job}", download_url=f"/jobs/{job}/download"))
+    response.status_code = code
+    if code == 202:
+        response.headers["Location"] = f"/jobs/{job}"
+    return response
+
+# Start an export of the current catalog in the background
+@app.route('/jobs/export', methods=['POST'])
+def submit_export_job():
+    export_format = request.values.get('format', 'xlsx').lower()
+    if export_format not in export_formats:
+        return jsonify({"error": "Unsupported export format"}), 400
+    current = catalog
+    status = job_runner.submit(
+        "export", {"format": export_format, "catalog": current.version}, export_job, (current.defects, export_format)
+    )
+    return job_response(status, 202)
+
+# Start a bulk analysis of a batch log uploaded as the "batches" file
+@app.route('/jobs/analyze/bulk', methods=['POST'])
+def submit_bulk_analysis_job():
+    upload = request.files.get('batches')
+    if upload is None:
+        return jsonify({"error": "upload a batch log as the 'batches' file"}), 400
+    file_format = "parquet" if upload.filename.lower().endswith(".parquet") else "csv"
+    data = upload.read()
+    status = job_runner.submit(
+        "analyze_bulk",
+        {"format": file_format, "sha256": hashlib.sha256(data).hexdigest()},
+        bulk_analysis_job,
+        (data, file_format),
+    )
+    return job_response(status, 202)
+
+# Kept jobs, newest first, with this worker's job pool load
+@app.route('/jobs')
+def list_jobs():
+    jobs = job_runner.list()
+    return jsonify({
+        "jobs": jobs,
+        "counts": {state: sum(job["status"] == state for job in jobs) for state in ("queued", "running", "done", "failed")},
+        "workers": job_runner.max_workers,
+        "pending_here": job_runner.pending,
+    })
+
+@app.route('/jobs/<job>')
+def job_status(job):
+    status = job_runner.status(job)
+    if status is None:
+        return jsonify({"error": "Job not found"}), 404
+    return job_response(status)
 
-    # Return the file for download
-    return send_file(filename, as_attachment=True)
+# A finished job's result; 202 with the status while it is still going
+@app.route('/jobs/<job>/download')
+def job_download(job):
+    status = job_runner.status(job)
+    if status is None:
+        return jsonify({"error": "Job not found"}), 404
+    if status["status"] == "failed":
+        return jsonify(dict(status, error=status.get("error", "Job failed"))), 409
+    if status["status"] != "done":
+        return job_response(status, 202)
+    try:
+        result = open(job_runner.result(job), "rb")
+    except FileNotFoundError:
+        # Expired and removed by another worker since its status was read;
+        # once open, the file stays readable even if that happens
+        return jsonify({"error": "Job not found"}), 404
+    response = send_file(result, mimetype=status["mimetype"], as_attachment=True, download_name=status["filename"])
+    response.content_length = os.fstat(result.fileno()).st_size
+    return response
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0")
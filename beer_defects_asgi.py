@@ -0,0 +1,226 @@
+# ASGI entry point, for many mostly idle keep-alive clients such as taproom
+# tablets polling the catalog. Connections are held by one event loop per
+# process instead of a whole sync worker each:
+#
+#   uvicorn beer_defects_asgi:app --workers 2
+#
+# Any ASGI server works; uvicorn isn't in requirements.txt since the sync
+# gunicorn setup remains the default.
+#
+# Requests still go through the Flask app, so every route, header and cache
+# rule is the same as under gunicorn. The async handler for each request
+# answers the catalog pages, troubleshooting, search and recipe analysis
+# right on the loop: they read the precomputed catalog and take well under a
+# millisecond. Everything else, like exports, uploads, batches, jobs and the
+# SQLite panel store, runs in a thread pool of BEER_DEFECTS_ASGI_THREADS
+# threads, with the request body and the response streamed across. So does
+# troubleshooting and search when BEER_DEFECTS_QUERY_CACHE_DB is set, as the
+# shared cache may wait on another worker's write to its SQLite file.
+#
+# For those routes to stay fast, nothing slow may happen inside them: the
+# catalog's indexes and compressed pages are built at startup, and a changed
+# catalog source is reloaded and warmed on the app's reload thread before
+# the new version is swapped in.
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from beer_defects_app import app as flask_app, query_cache, warm_catalog
+
+# Routes answered on the event loop, by exact path or path prefix
+inline_paths = {"/", "/defects", "/search", "/troubleshoot", "/analyze", "/api/defects", "/api/troubleshoot/rank"}
+inline_prefixes = ("/defect/", "/api/defects/")
+
+# Inline routes that read and write the query cache
+cached_paths = {"/search", "/troubleshoot", "/api/troubleshoot/rank"}
+
+# Bodies larger than this (or of unknown length) are never read on the loop
+inline_body_limit = 64 * 1024
+
+thread_count = int(os.environ.get("BEER_DEFECTS_ASGI_THREADS", "8"))
+executor = None
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=thread_count, thread_name_prefix="beer-defects-asgi")
+    return executor
+
+def header_value(scope, name):
+    for key, value in scope["headers"]:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+def runs_inline(scope):
+    path = scope["path"]
+    if path not in inline_paths and not path.startswith(inline_prefixes):
+        return False
+    if query_cache.path is not None and path in cached_paths:
+        return False
+    if scope["method"] in ("GET", "HEAD"):
+        return True
+    length = header_value(scope, b"content-length")
+    return length is not None and length.isdigit() and int(length) <= inline_body_limit
+
+# The WSGI environ of an ASGI HTTP request, reading its body from `body`
+def wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        # WSGI carries paths as latin-1 decoded bytes
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # The body ends where the client's does, whatever Content-Length says
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+# Run the Flask app on `environ`; `send_start(status, headers)` and
+# `send_body(data)` get the response as it is produced
+def run_wsgi(environ, send_start, send_body):
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        started[:] = [(int(status.split(" ", 1)[0]), headers)]
+        return send_body
+
+    chunks = flask_app(environ, start_response)
+    try:
+        sent = False
+        for chunk in chunks:
+            if not sent:
+                send_start(*started[0])
+                sent = True
+            if chunk:
+                send_body(chunk)
+        if not sent:
+            send_start(*started[0])
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+def encode_headers(headers):
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+# A request body read from the event loop by a pool thread
+class RequestBody(io.RawIOBase):
+    def __init__(self, loop, receive):
+        self.loop = loop
+        self.receive = receive
+        self.pending = b""
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self.pending and not self.finished:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message["type"] == "http.disconnect":
+                raise OSError("client disconnected")
+            self.pending = message.get("body", b"")
+            self.finished = not message.get("more_body", False)
+        count = min(len(target), len(self.pending))
+        target[:count] = self.pending[:count]
+        self.pending = self.pending[count:]
+        return count
+
+async def read_body(receive):
+    parts = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise OSError("client disconnected")
+        parts.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(parts)
+
+async def handle_inline(scope, receive, send):
+    body = await read_body(receive)
+    response = []
+
+    def send_start(status, headers):
+        response.append({"type": "http.response.start", "status": status, "headers": encode_headers(headers)})
+
+    def send_body(data):
+        response.append({"type": "http.response.body", "body": data, "more_body": True})
+
+    run_wsgi(wsgi_environ(scope, io.BytesIO(body)), send_start, send_body)
+    for message in response:
+        await send(message)
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+async def handle_in_thread(scope, receive, send):
+    loop = asyncio.get_running_loop()
+
+    def send_message(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def send_start(status, headers):
+        send_message({"type": "http.response.start", "status": status, "headers": encode_headers(headers)})
+
+    def send_body(data):
+        send_message({"type": "http.response.body", "body": data, "more_body": True})
+
+    def run():
+        body = io.BufferedReader(RequestBody(loop, receive))
+        run_wsgi(wsgi_environ(scope, body), send_start, send_body)
+
+    await loop.run_in_executor(get_executor(), run)
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Build the indexes before serving, as gunicorn's preload does
+            try:
+                await asyncio.get_running_loop().run_in_executor(get_executor(), warm_catalog, True)
+            except Exception as error:
+                await send({"type": "lifespan.startup.failed", "message": repr(error)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if executor is not None:
+                executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http":
+        try:
+            if runs_inline(scope):
+                await handle_inline(scope, receive, send)
+            else:
+                await handle_in_thread(scope, receive, send)
+        except OSError:
+            # The client went away; there is nobody left to answer
+            pass
+    else:
+        raise ValueError(f"unsupported ASGI scope: {scope['type']}")
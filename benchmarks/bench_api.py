@@ -0,0 +1,65 @@
+# The JSON catalog API against the HTML routes it replaces for scrapers, and
+# stitching pre-serialized defects against encoding each page per request.
+#
+#   python benchmarks/bench_api.py
+import json
+
+from common import fmt_seconds, scaled_catalog, timeit
+
+import beer_defects_app
+from beer_defects_app import app, refresh_catalog
+
+
+# What /api/defects would cost if each page were encoded per request
+def encode_page(defects, names, fields=None):
+    items = []
+    for name in names:
+        details = defects[name]
+        if fields:
+            details = {field: details[field] for field in fields if field in details}
+        items.append(dict(name=name, **details))
+    return json.dumps({"defects": items, "next": None, "total": len(defects)}, ensure_ascii=False).encode("utf-8")
+
+
+def main():
+    client = app.test_client()
+    print(f"{'defects':>8} {'route':<44} {'time':>10} {'bytes':>10}")
+    for size in (1_000, 100_000):
+        defects = scaled_catalog(size)
+        current = refresh_catalog(defects)
+        name = list(defects)[size // 2]
+        client.get("/api/defects")  # serialize the catalog once
+        page_names = list(defects)[:100]
+        cursor = beer_defects_app.encode_cursor(current.version, size // 2)
+
+        def run(path):
+            response = client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+            return len(response.data)
+
+        def walk():
+            path = "/api/defects?limit=1000"
+            while path:
+                body = client.get(path).get_json()
+                path = f"/api/defects?limit=1000&cursor={body['next']}" if body["next"] else None
+
+        cases = [
+            ("GET /defects (HTML, whole catalog)", lambda: run("/defects"), max(1, 2_000 // size)),
+            ("GET /defect/<name> (HTML)", lambda: run(f"/defect/{name}"), 1_000),
+            ("GET /api/defects/<name>", lambda: run(f"/api/defects/{name}"), 1_000),
+            ("GET /api/defects (100, first page)", lambda: run("/api/defects"), 500),
+            ("GET /api/defects (100, mid-catalog cursor)", lambda: run(f"/api/defects?cursor={cursor}"), 500),
+            ("GET /api/defects?fields=Category,Off-Flavors", lambda: run("/api/defects?fields=Category,Off-Flavors"), 500),
+            ("GET /api/defects?category=fermentation", lambda: run("/api/defects?category=fermentation"), 500),
+            ("encode 100 defects per request", lambda: len(encode_page(defects, page_names)), 500),
+            ("walk whole catalog, 1000 per page", walk, max(1, 2_000 // size)),
+        ]
+        for label, func, number in cases:
+            size_bytes = func()
+            seconds = timeit(func, number=number, repeat=3)
+            shown = f"{size_bytes:>10,}" if isinstance(size_bytes, int) else f"{'':>10}"
+            print(f"{size:>8} {label:<44} {fmt_seconds(seconds):>10} {shown}")
+
+
+if __name__ == "__main__":
+    main()
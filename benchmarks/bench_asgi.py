@@ -0,0 +1,186 @@
+# Many polling keep-alive clients (taproom tablets) against gunicorn's sync
+# workers and against the ASGI entry point under uvicorn, with the same
+# number of worker processes. Each client keeps one connection open while
+# the server allows it and requests a catalog page about every --think
+# seconds. Reports throughput, latency, connection churn and how many
+# clients had a connection open.
+#
+#   python benchmarks/bench_asgi.py [--clients 1000] [--seconds 20] [--workers 2]
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+import common  # noqa: F401
+
+from bench_routes import ROOT, free_port
+
+PATHS = [
+    "/",
+    "/defects",
+    "/defect/Diacetyl",
+    "/defect/Oxidation",
+    "/api/defects?limit=20",
+    "/api/defects/Diacetyl",
+    "/search?query=yeast",
+    "/troubleshoot",
+]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.connects = 0
+        self.open = 0
+        self.served = set()
+        self.open_samples = []
+
+
+# Status and whether the server keeps the connection open, after reading the
+# whole response
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip().lower()
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get("connection") != "close"
+
+
+async def client(number, port, start_at, deadline, think, timeout, stats):
+    rng = random.Random(number)
+    await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+                stats.connects += 1
+                stats.open += 1
+            started = time.perf_counter()
+            writer.write(f"GET {rng.choice(PATHS)} HTTP/1.1\r\nHost: taproom\r\n\r\n".encode("ascii"))
+            status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+            if status != 200:
+                raise OSError(f"status {status}")
+            stats.latencies.append(time.perf_counter() - started)
+            stats.served.add(number)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            stats.errors += 1
+            keep_alive = False
+        if not keep_alive and writer is not None:
+            writer.close()
+            writer = None
+            stats.open -= 1
+        await asyncio.sleep(think * rng.uniform(0.5, 1.5))
+    if writer is not None:
+        writer.close()
+        stats.open -= 1
+
+
+async def sample_open(stats, deadline):
+    while time.monotonic() < deadline:
+        stats.open_samples.append(stats.open)
+        await asyncio.sleep(0.25)
+
+
+async def load(port, clients, seconds, ramp, think, timeout):
+    stats = Stats()
+    now = time.monotonic()
+    deadline = now + ramp + seconds
+    tasks = [
+        client(number, port, now + ramp * number / clients, deadline, think, timeout, stats)
+        for number in range(clients)
+    ]
+    measured_from = now + ramp
+
+    async def measure():
+        await asyncio.sleep(ramp)
+        stats.latencies.clear()
+        await sample_open(stats, deadline)
+
+    await asyncio.gather(measure(), *tasks)
+    return stats, time.monotonic() - measured_from
+
+
+def wait_until_up(port, server):
+    import urllib.request
+
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=2).read()
+            return
+        except OSError:
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError("server did not start")
+            time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--ramp", type=float, default=5)
+    parser.add_argument("--think", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    servers = []
+    if shutil.which("gunicorn"):
+        servers.append(("gunicorn sync", [shutil.which("gunicorn"), "-w", str(args.workers), "beer_defects_app:app"]))
+    if shutil.which("uvicorn"):
+        servers.append((
+            "uvicorn asgi",
+            [shutil.which("uvicorn"), "--workers", str(args.workers), "--log-level", "warning",
+             "--backlog", "4096", "beer_defects_asgi:app"],
+        ))
+    if not servers:
+        sys.exit("neither gunicorn nor uvicorn is installed")
+
+    print(f"{args.clients} clients polling every ~{args.think:g}s for {args.seconds:g}s, {args.workers} workers")
+    print(f"{'server':<14} {'req/s':>7} {'p50':>8} {'p99':>8} {'errors':>7} {'connects':>9} {'served':>7} {'open avg':>9}")
+    for label, command in servers:
+        port = free_port()
+        bind = ["-b", f"127.0.0.1:{port}"] if "gunicorn" in label else ["--host", "127.0.0.1", "--port", str(port)]
+        server = subprocess.Popen(
+            command[:1] + bind + command[1:], cwd=ROOT, env=dict(os.environ),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(port, server)
+            stats, elapsed = asyncio.run(load(port, args.clients, args.seconds, args.ramp, args.think, args.timeout))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+        latencies = sorted(stats.latencies) or [float("nan")]
+        open_avg = sum(stats.open_samples) / max(len(stats.open_samples), 1)
+        print(
+            f"{label:<14} {len(stats.latencies) / elapsed:>7.0f} "
+            f"{latencies[len(latencies) // 2] * 1000:>6.1f}ms {latencies[int(len(latencies) * 0.99)] * 1000:>6.0f}ms "
+            f"{stats.errors:>7} {stats.connects:>9} {len(stats.served):>7} {open_avg:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Throughput of /api/troubleshoot/batch at 10k reports per request, against
+# answering the same reports one at a time with DefectIndex.match().
+#
+#   python benchmarks/bench_batch.py
+import json
+import random
+import time
+
+from common import scaled_catalog, timeit
+
+import beer_defects_app
+from beer_defects_app import DefectIndex, app
+
+REPORTS = 10_000
+STAGES = ["", "fermentation", "packaging", "water", "mash", "boil"]
+
+
+def random_reports(defects, count, seed=0):
+    rng = random.Random(seed)
+    flavors = sorted({flavor.lower() for details in defects.values() for flavor in details.get("Off-Flavors", [])})
+    return [
+        (rng.choice(STAGES), rng.sample(flavors, rng.randint(0, 3)))
+        for _ in range(count)
+    ]
+
+
+def main():
+    print(f"{'entries':>8} {'loop reports/s':>15} {'batch reports/s':>16} {'http reports/s':>15}")
+    for size in (10, 1_000, 10_000):
+        defects = scaled_catalog(size)
+        index = DefectIndex(defects)
+        reports = random_reports(defects, REPORTS)
+        assert index.match_batch(reports) == [index.match(stage, flavors) for stage, flavors in reports]
+
+        loop = timeit(lambda: [index.match(stage, flavors) for stage, flavors in reports], number=1, repeat=3)
+        batch = timeit(lambda: index.match_batch(reports), number=1, repeat=3)
+
+        # The whole request, including JSON parsing and encoding
+        beer_defects_app.refresh_catalog(defects)
+        client = app.test_client()
+        body = json.dumps([{"stage": stage, "off_flavors": flavors} for stage, flavors in reports])
+        start = time.perf_counter()
+        response = client.post("/api/troubleshoot/batch", data=body, content_type="application/json")
+        http = time.perf_counter() - start
+        assert response.status_code == 200
+
+        print(f"{size:>8} {REPORTS / loop:>15,.0f} {REPORTS / batch:>16,.0f} {REPORTS / http:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Rows/sec of the bulk recipe analysis behind /analyze/bulk on a synthetic
+# batch log. Exits non-zero when CSV throughput falls below the target.
+#
+#   python benchmarks/bench_bulk_analysis.py [rows]
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import common  # noqa: F401  (puts the app on sys.path)
+from beer_defects_app import recipe_rule_index
+from recipe_analysis import analyze_batch_log
+
+TARGET_ROWS_PER_SEC = 500_000
+
+
+def batch_log(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "batch": np.char.add("B", np.arange(rows).astype(str)),
+        "boil_time": rng.integers(30, 120, rows),
+        "ferment_temp": rng.normal(66, 4, rows).round(1),
+    })
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    frame = batch_log(rows)
+    uploads = {"csv": frame.to_csv(index=False).encode()}
+    try:
+        parquet = io.BytesIO()
+        frame.to_parquet(parquet)
+        uploads["parquet"] = parquet.getvalue()
+    except ImportError:
+        pass
+
+    results = {}
+    for file_format, data in uploads.items():
+        start = time.perf_counter()
+        total, flagged, counts, issues = analyze_batch_log(io.BytesIO(data), file_format, recipe_rule_index)
+        seconds = time.perf_counter() - start
+        assert total == rows
+        results[file_format] = rows / seconds
+        print(f"{file_format:>8}: {rows:,} rows in {seconds:.2f} s = {rows / seconds:,.0f} rows/s ({flagged:,} flagged)")
+
+    if results["csv"] < TARGET_ROWS_PER_SEC:
+        sys.exit(f"CSV throughput below target of {TARGET_ROWS_PER_SEC:,} rows/s")
+
+
+if __name__ == "__main__":
+    main()
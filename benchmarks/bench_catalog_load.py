@@ -0,0 +1,35 @@
+# Worker startup cost of loading the catalog: parsing the xlsx workbook or
+# SQLite database cold, against loading the pickle snapshot cached next to
+# it.
+#
+#   python benchmarks/bench_catalog_load.py
+import os
+import tempfile
+
+from common import fmt_seconds, scaled_catalog, timeit
+
+from beer_defects_app import build_export
+from catalog_store import load_defects, read_source, write_sqlite
+
+
+def main():
+    print(f"{'entries':>8} {'source':>7} {'cold parse':>11} {'snapshot':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (10, 1_000, 10_000):
+            defects = scaled_catalog(size)
+            xlsx = os.path.join(directory, f"catalog-{size}.xlsx")
+            with open(xlsx, "wb") as workbook:
+                workbook.write(build_export(defects, "xlsx"))
+            sqlite = os.path.join(directory, f"catalog-{size}.sqlite")
+            write_sqlite(defects, sqlite)
+
+            for path in (xlsx, sqlite):
+                assert load_defects(path) == defects  # parses and writes the snapshot
+                cold = timeit(lambda: read_source(path), number=1, repeat=3)
+                cached = timeit(lambda: load_defects(path), number=3, repeat=3)
+                source = os.path.splitext(path)[1][1:]
+                print(f"{size:>8} {source:>7} {fmt_seconds(cold):>11} {fmt_seconds(cached):>10} {cold / cached:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Memory of the catalog in each worker: the nested dicts unpickled from the
+# snapshot against a CompactCatalog mapped from its compact snapshot. Reports
+# bytes per defect, what lookups cost in each form, and the resident and
+# proportional (shared pages split between processes) memory each of several
+# concurrent workers adds: by loading the catalog data alone, and as a real
+# app worker, which also pre-renders every page and builds the indexes from
+# that data (Catalog plus warm()) and so holds per-worker copies either way.
+#
+#   python benchmarks/bench_compact_catalog.py [--size 100000] [--workers 4] [--skip-app]
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from common import fmt_seconds, scaled_catalog, timeit
+
+from bench_startup import ROOT, proc_kb
+from catalog_store import compact_snapshot_path, load_defects, snapshot_path, write_sqlite
+
+# Loads the catalog, reads every value of it as a page render would ("data"),
+# or starts the app on it and warms it ("app"), then reports its memory and
+# startup time and waits for the benchmark to finish measuring
+WORKER_SCRIPT = """
+import os, sys, time
+import flask
+
+# Not bench_startup's: importing the benchmarks' common module loads the app
+# on the built-in catalog
+def proc_kb(pid, filename, field):
+    with open(f"/proc/{pid}/{filename}") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+before = proc_kb("self", "status", "VmRSS"), proc_kb("self", "smaps_rollup", "Pss")
+started = time.perf_counter()
+if sys.argv[3] == "app":
+    os.environ["BEER_DEFECTS_CATALOG"] = sys.argv[1]
+    os.environ["BEER_DEFECTS_COMPACT_CATALOG"] = "1" if sys.argv[2] == "compact" else "0"
+    import beer_defects_app
+    beer_defects_app.warm_catalog()
+else:
+    from catalog_store import load_defects
+    defects = load_defects(sys.argv[1], compact=sys.argv[2] == "compact")
+    for name, details in defects.items():
+        for value in details.values():
+            pass
+print(before[0], before[1], time.perf_counter() - started, flush=True)
+sys.stdin.read()
+"""
+
+
+def worker_memory(path, form, workers, mode):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, "benchmarks")]))
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", WORKER_SCRIPT, path, form, mode],
+            cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        for _ in range(workers)
+    ]
+    try:
+        # Measured once every worker has loaded, so shared pages are split
+        # between all of them
+        baselines = [process.stdout.readline().split() for process in processes]
+        return [
+            (
+                (proc_kb(process.pid, "status", "VmRSS") - int(rss)) / 1024,
+                (proc_kb(process.pid, "smaps_rollup", "Pss") - int(pss)) / 1024,
+                float(seconds),
+            )
+            for process, (rss, pss, seconds) in zip(processes, baselines)
+        ]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+
+def heap_bytes(load):
+    tracemalloc.start()
+    try:
+        loaded = load()
+        return tracemalloc.get_traced_memory()[0], loaded
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--skip-app", action="store_true", help="only measure loading the catalog data")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.sqlite")
+        write_sqlite(scaled_catalog(args.size), path)
+        # Write both snapshots
+        defects = load_defects(path)
+        compact = load_defects(path, compact=True)
+        assert dict(compact.items()) == defects
+
+        dict_bytes, _ = heap_bytes(lambda: load_defects(path))
+        compact_heap, _ = heap_bytes(lambda: load_defects(path, compact=True))
+        print(f"{args.size} defects")
+        print(f"{'form':>8} {'file':>10} {'heap':>10} {'per defect':>11}")
+        print(f"{'dict':>8} {os.path.getsize(snapshot_path(path)) / 2**20:>8.1f}MB {dict_bytes / 2**20:>8.1f}MB "
+              f"{dict_bytes / args.size:>9.0f} B")
+        compact_bytes = os.path.getsize(compact_snapshot_path(path))
+        print(f"{'compact':>8} {compact_bytes / 2**20:>8.1f}MB {compact_heap / 2**20:>8.1f}MB "
+              f"{compact_bytes / args.size:>9.0f} B  (mapped, shared)")
+
+        names = list(defects)[::max(args.size // 1000, 1)]
+        print()
+        print(f"{'form':>8} {'load':>10} {'name lookup':>12} {'defect page':>12} {'full walk':>10}")
+        for form, loaded in (("dict", defects), ("compact", compact)):
+            load = timeit(lambda: load_defects(path, compact=form == "compact"), number=1, repeat=3)
+            lookup = timeit(lambda: [loaded[name] for name in names], number=5) / len(names)
+            page = timeit(lambda: [dict(loaded[name].items()) for name in names], number=5) / len(names)
+            walk = timeit(lambda: [list(details.values()) for details in loaded.values()], number=1, repeat=3)
+            print(f"{form:>8} {fmt_seconds(load):>10} {fmt_seconds(lookup):>12} {fmt_seconds(page):>12} {fmt_seconds(walk):>10}")
+
+        print()
+        print(f"{args.workers} concurrent workers, memory each adds and its startup time")
+        print(f"{'worker':>12} {'form':>8} {'RSS':>10} {'PSS':>10} {'startup':>10}")
+        modes = ["data"] + ([] if args.skip_app else ["app"])
+        for mode in modes:
+            for form in ("dict", "compact"):
+                memory = worker_memory(path, form, args.workers, mode)
+                rss = sum(rss for rss, _, _ in memory) / len(memory)
+                pss = sum(pss for _, pss, _ in memory) / len(memory)
+                startup = sum(seconds for _, _, seconds in memory) / len(memory)
+                label = "catalog data" if mode == "data" else "app, warmed"
+                print(f"{label:>12} {form:>8} {rss:>8.1f}MB {pss:>8.1f}MB {fmt_seconds(startup):>10}")
+
+
+if __name__ == "__main__":
+    main()
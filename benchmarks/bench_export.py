@@ -0,0 +1,30 @@
+# Generation time and size of each /export format, plus the cost of a
+# repeat once Catalog.export keeps it for the catalog version (as /export
+# does for XLSX and Parquet; the other formats are streamed, see
+# bench_export_stream.py).
+#
+#   python benchmarks/bench_export.py
+import os
+
+from common import fmt_seconds, scaled_catalog, timeit
+
+from beer_defects_app import Catalog, build_export, export_formats
+
+
+def main():
+    print(f"{'entries':>8} {'format':>8} {'generate':>10} {'cached':>10} {'bytes':>12}")
+    for size in (10, 1_000, 10_000):
+        catalog = Catalog(scaled_catalog(size))
+        for export_format in export_formats:
+            try:
+                generate = timeit(lambda: build_export(catalog.defects, export_format), number=1, repeat=3)
+            except ImportError:
+                print(f"{size:>8} {export_format:>8} {'unavailable':>10}")
+                continue
+            cached = timeit(lambda: catalog.export(export_format), number=1000)
+            size_bytes = os.fstat(catalog.export(export_format).fileno()).st_size
+            print(f"{size:>8} {export_format:>8} {fmt_seconds(generate):>10} {fmt_seconds(cached):>10} {size_bytes:>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Peak memory and time to first byte of /export, streamed a defect at a time
+# against building the whole DataFrame and file first (the pandas path every
+# format used before). Each run is a fresh process; peak memory is how far
+# the export raised its peak RSS above that of the loaded catalog.
+#
+#   python benchmarks/bench_export_stream.py [--sizes 10000,100000,1000000] [--dataframe-max 100000]
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from common import scaled_catalog
+
+from catalog_export import export_writers
+
+FORMATS = ["csv", "ndjson", "json", "xlsx"]
+
+
+# The whole export as one file from a DataFrame, as /export used to make it
+def dataframe_export(defects, export_format):
+    import pandas as pd
+
+    df = pd.DataFrame.from_dict(defects, orient="index")
+    buffer = io.BytesIO()
+    if export_format == "xlsx":
+        df.to_excel(buffer)
+    elif export_format == "csv":
+        df.to_csv(buffer)
+    elif export_format == "json":
+        df.to_json(buffer, orient="index", force_ascii=False)
+    else:
+        df.to_json(buffer, orient="records", lines=True, force_ascii=False)
+    yield buffer.getvalue()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Runs in the child process: export and print the measurements as JSON
+def measure(size, export_format, mode):
+    defects = scaled_catalog(size)
+    if export_format == "xlsx" or mode == "dataframe":
+        # Imports aren't part of what is measured
+        import openpyxl  # noqa: F401
+        import pandas  # noqa: F401
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    chunks = export_writers[export_format](defects) if mode == "streamed" else dataframe_export(defects, export_format)
+    first_byte = None
+    total = 0
+    for chunk in chunks:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        total += len(chunk)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"peak_mb": peak_rss_mb() - before, "first_byte": first_byte, "elapsed": elapsed, "bytes": total}))
+
+
+def run(size, export_format, mode):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", str(size), export_format, mode],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--dataframe-max", type=int, default=100_000,
+                        help="largest catalog exported through a DataFrame for comparison")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        size, export_format, mode = args.child
+        measure(int(size), export_format, mode)
+        return
+
+    print(f"{'entries':>9} {'format':>7} {'mode':>10} {'peak +RSS':>10} {'first byte':>11} {'total':>9} {'size':>9}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        for export_format in args.formats.split(","):
+            modes = ["streamed"] + (["dataframe"] if size <= args.dataframe_max else [])
+            for mode in modes:
+                result = run(size, export_format, mode)
+                print(
+                    f"{size:>9} {export_format:>7} {mode:>10} {result['peak_mb']:>8.1f}MB "
+                    f"{result['first_byte']:>10.3f}s {result['elapsed']:>8.2f}s {result['bytes'] / 2**20:>7.1f}MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# Bytes on the wire and latency of the catalog pages for a cold request in
+# each encoding, and for a revalidation that comes back 304.
+#
+#   python benchmarks/bench_http_cache.py
+from common import fmt_seconds, scaled_catalog, timeit
+
+import beer_defects_app
+from beer_defects_app import app
+
+ENCODINGS = ["identity", "gzip", "br"]
+
+
+def wire_bytes(response):
+    headers = sum(len(f"{name}: {value}\r\n") for name, value in response.headers.items())
+    return len(f"HTTP/1.1 {response.status}\r\n") + headers + 2 + len(response.get_data())
+
+
+def main():
+    beer_defects_app.refresh_catalog(scaled_catalog(1_000))
+    client = app.test_client()
+    name = next(iter(beer_defects_app.catalog.defects))
+    print(f"{'page':<20} {'encoding':>9} {'cold bytes':>11} {'cold':>9} {'304 bytes':>10} {'304':>9}")
+    for path in ["/", "/defects", f"/defect/{name}"]:
+        for encoding in ENCODINGS:
+            if encoding not in beer_defects_app.page_encodings:
+                continue
+            headers = {"Accept-Encoding": encoding}
+            cold = client.get(path, headers=headers)
+            assert cold.status_code == 200
+            revalidate = dict(headers, **{"If-None-Match": cold.headers["ETag"]})
+            warm = client.get(path, headers=revalidate)
+            assert warm.status_code == 304
+
+            cold_time = timeit(lambda: client.get(path, headers=headers), number=300)
+            warm_time = timeit(lambda: client.get(path, headers=revalidate), number=300)
+            print(
+                f"{path[:20]:<20} {encoding:>9} {wire_bytes(cold):>11,} {fmt_seconds(cold_time):>9} "
+                f"{wire_bytes(warm):>10,} {fmt_seconds(warm_time):>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
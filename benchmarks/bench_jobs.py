@@ -0,0 +1,122 @@
+# How much a slow export holds up other requests, run inside the request
+# versus as a background job. A gunicorn with --workers sync workers serves
+# a catalog of --size entries; while one client downloads the xlsx export,
+# others keep requesting the home page, and their latency is reported.
+#
+#   python benchmarks/bench_jobs.py --size 20000 --workers 1
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import scaled_catalog
+
+from bench_routes import ROOT, free_port
+from catalog_store import write_sqlite
+
+
+def request(port, method, path):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+    try:
+        connection.request(method, path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def wait_until_up(port, server):
+    deadline = time.monotonic() + 120
+    while True:
+        try:
+            request(port, "GET", "/")
+            return
+        except OSError:
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError("gunicorn did not start")
+            time.sleep(0.2)
+
+
+def export_in_request(port):
+    status, _ = request(port, "GET", "/export")
+    assert status == 200, status
+
+
+def export_as_job(port):
+    status, body = request(port, "POST", "/jobs/export")
+    assert status == 202, status
+    job = json.loads(body)["id"]
+    while True:
+        status, body = request(port, "GET", f"/jobs/{job}/download")
+        if status == 200:
+            return
+        assert status == 202, (status, body)
+        time.sleep(0.05)
+
+
+# Home page latencies measured while `export` runs
+def latencies_during(port, export):
+    done = threading.Event()
+    latencies = []
+
+    def poll():
+        while not done.is_set():
+            start = time.perf_counter()
+            request(port, "GET", "/")
+            latencies.append(time.perf_counter() - start)
+            # Paced like a busy user rather than a tight loop, which would
+            # take CPU from the job on a small box
+            time.sleep(0.01)
+
+    poller = threading.Thread(target=poll)
+    start = time.perf_counter()
+    exporter = threading.Thread(target=lambda: (export(port), done.set()))
+    exporter.start()
+    time.sleep(0.05)
+    poller.start()
+    exporter.join()
+    elapsed = time.perf_counter() - start
+    poller.join()
+    return elapsed, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    if not shutil.which("gunicorn"):
+        sys.exit("gunicorn is not installed")
+
+    print(f"{'mode':<11} {'export':>9} {'home requests':>14} {'home p50':>10} {'home max':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "catalog.sqlite")
+        write_sqlite(scaled_catalog(args.size), source)
+        for mode, export in (("in request", export_in_request), ("as job", export_as_job)):
+            port = free_port()
+            env = dict(os.environ, BEER_DEFECTS_CATALOG=source, BEER_DEFECTS_JOBS_DIR=os.path.join(directory, f"jobs-{port}"))
+            server = subprocess.Popen(
+                [shutil.which("gunicorn"), "-w", str(args.workers), "-b", f"127.0.0.1:{port}", "beer_defects_app:app"],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_until_up(port, server)
+                elapsed, latencies = latencies_during(port, export)
+                print(
+                    f"{mode:<11} {elapsed:>8.2f}s {len(latencies):>14} "
+                    f"{latencies[len(latencies) // 2] * 1000:>8.1f}ms {latencies[-1] * 1000:>8.0f}ms"
+                )
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
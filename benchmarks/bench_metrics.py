@@ -0,0 +1,49 @@
+# Overhead of the /metrics instrumentation: the cost of recording one request
+# and one span, and a request through the test client with metrics switched
+# on and off. Exits non-zero when recording a request costs more than
+# --budget-us microseconds.
+#
+#   python benchmarks/bench_metrics.py [--budget-us 5]
+import argparse
+import sys
+import tempfile
+
+from common import timeit
+
+from beer_defects_app import app, metrics
+from metrics import Metrics
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-us", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, recorder in (("in-process", Metrics()), ("directory", Metrics(directory=directory))):
+            request = timeit(lambda: recorder.observe_request("/defect/<name>", "GET", 200, 0.0004), number=100_000)
+
+            def span():
+                with recorder.span("troubleshoot.match"):
+                    pass
+
+            span_cost = timeit(span, number=100_000)
+            print(f"{label:>10}: record request {request * 1e6:.2f} us, empty span {span_cost * 1e6:.2f} us")
+
+    client = app.test_client()
+    timings = {}
+    for enabled in (False, True):
+        metrics.enabled = enabled
+        timings[enabled] = timeit(lambda: client.get("/defects"), number=2_000, repeat=7)
+    metrics.enabled = True
+    print(
+        f"GET /defects: {timings[False] * 1e6:.1f} us without metrics, {timings[True] * 1e6:.1f} us with "
+        f"({(timings[True] - timings[False]) * 1e6:+.1f} us)"
+    )
+
+    if request * 1e6 > args.budget_us:
+        sys.exit(f"recording a request costs {request * 1e6:.2f} us, budget {args.budget_us} us")
+
+
+if __name__ == "__main__":
+    main()
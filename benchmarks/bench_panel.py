@@ -0,0 +1,76 @@
+# Sensory panel ingest rate (tastings/s into the SQLite rollups) and how long
+# the trend queries take as history grows. Ingest time per batch staying flat
+# from the first batch to the last shows each tasting costs the same however
+# much history there is.
+#
+#   python benchmarks/bench_panel.py --tastings 500000 --batch 1000
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from common import fmt_seconds, timeit
+
+from beer_defects_app import catalog, parse_report
+from panel_rollups import PanelStore
+
+FLAVORS = [
+    "buttery", "butter", "cardboard", "papery", "band-aid", "medicinal", "tart", "sour", "hot",
+    "solventy", "metallic", "cooked corn", "vegetal", "puckering", "stale",
+]
+
+
+def tastings(count, rng):
+    start = date(2024, 1, 1)
+    for i in range(count):
+        record = {
+            "date": (start + timedelta(days=i * 180 // count)).isoformat(),
+            "beer": f"Beer {rng.randrange(12)}",
+            "line": f"Line {rng.randrange(4)}",
+        }
+        # Most tastings are clean
+        if rng.random() < 0.3:
+            record["off_flavors"] = rng.sample(FLAVORS, rng.randint(1, 3))
+        yield record
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tastings", type=int, default=500_000)
+    parser.add_argument("--batch", type=int, default=1_000)
+    args = parser.parse_args()
+
+    rng = random.Random(16)
+    with tempfile.TemporaryDirectory() as directory:
+        store = PanelStore(os.path.join(directory, "panel.sqlite"))
+        batch = []
+        batch_times = []
+        start = time.perf_counter()
+        for record in tastings(args.tastings, rng):
+            batch.append((record,) + parse_report(record))
+            if len(batch) == args.batch:
+                began = time.perf_counter()
+                store.ingest(batch, catalog.index.match_batch)
+                batch_times.append(time.perf_counter() - began)
+                batch = []
+        if batch:
+            store.ingest(batch, catalog.index.match_batch)
+        elapsed = time.perf_counter() - start
+
+        tenth = max(1, len(batch_times) // 10)
+        print(f"ingested {args.tastings:,} tastings in {elapsed:.1f} s: {args.tastings / elapsed:,.0f} tastings/s")
+        print(
+            f"per batch of {args.batch}: first tenth {fmt_seconds(sum(batch_times[:tenth]) / tenth)}, "
+            f"last tenth {fmt_seconds(sum(batch_times[-tenth:]) / tenth)}"
+        )
+        print(f"rollup database: {os.path.getsize(os.path.join(directory, 'panel.sqlite')) / 2**20:.1f} MB")
+        for dimensions in [(), ("day",), ("beer",), ("beer", "line")]:
+            rows = store.rollup(dimensions, since="2024-05-01")
+            seconds = timeit(lambda: store.rollup(dimensions, since="2024-05-01"), number=5, repeat=3)
+            print(f"rollup by {','.join(dimensions) or 'total':<10} {len(rows):>6} rows {fmt_seconds(seconds):>10}")
+
+
+if __name__ == "__main__":
+    main()
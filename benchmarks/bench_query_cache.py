@@ -0,0 +1,97 @@
+# Troubleshooting and search under a Zipf-distributed query mix, as tasting
+# room traffic repeats a few queries most of the time: requests per second
+# and hit rate without the query cache, with the in-process cache, and with
+# the shared SQLite file as well (answering a second "worker" whose own cache
+# starts cold).
+#
+#   python benchmarks/bench_query_cache.py [--size 20000] [--requests 5000]
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import scaled_catalog
+
+import beer_defects_app
+from query_cache import QueryCache
+
+STAGES = ["", "fermentation", "packaging", "conditioning"]
+
+
+# Distinct queries, most popular first: a form post for /troubleshoot (match
+# or rank) or a /search query
+def query_pool(defects, count, rng):
+    flavors = sorted({flavor.lower() for details in defects.values() for flavor in details.get("Off-Flavors", [])})
+    words = sorted({word for flavor in flavors for word in flavor.split() if word.isalpha()})
+    pool = []
+    while len(pool) < count:
+        kind = rng.choice(["match", "match", "rank", "search"])
+        if kind == "search":
+            pool.append(("search", {"query": " ".join(rng.sample(words, rng.randint(1, 2)))}))
+        else:
+            form = {"stage": rng.choice(STAGES), "off_flavors": ", ".join(rng.sample(flavors, rng.randint(1, 3)))}
+            if kind == "rank":
+                form["rank"] = "1"
+            pool.append((kind, form))
+    return pool
+
+
+def zipf_workload(pool, requests, exponent, rng):
+    weights = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(pool) + 1)))
+    return rng.choices(pool, cum_weights=weights, k=requests)
+
+
+def run(client, workload):
+    start = time.perf_counter()
+    for kind, form in workload:
+        if kind == "search":
+            response = client.get("/search", query_string=form)
+        else:
+            response = client.post("/troubleshoot", data=form)
+        assert response.status_code == 200
+    return len(workload) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--cache-size", type=int, default=256)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    defects = scaled_catalog(args.size)
+    beer_defects_app.refresh_catalog(defects)
+    beer_defects_app.warm_catalog()
+    client = beer_defects_app.app.test_client()
+    pool = query_pool(defects, args.queries, rng)
+    print(f"{args.size} defects, {args.queries} distinct queries, {args.requests} requests, cache of {args.cache_size}")
+    print(f"{'zipf s':>6} {'cache':>14} {'req/s':>8} {'hit rate':>9} {'evictions':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for exponent in (0.8, 1.1, 1.5):
+            workload = zipf_workload(pool, args.requests, exponent, rng)
+            shared_path = os.path.join(directory, f"cache-{exponent}.sqlite")
+            setups = [
+                ("off", QueryCache(max_entries=0)),
+                ("in-process", QueryCache(max_entries=args.cache_size)),
+                # The first worker fills the shared file, then a second one
+                # with an empty cache of its own runs the same traffic
+                ("shared, cold", QueryCache(max_entries=args.cache_size, path=shared_path)),
+                ("shared, 2nd", QueryCache(max_entries=args.cache_size, path=shared_path)),
+            ]
+            for label, cache in setups:
+                beer_defects_app.query_cache = cache
+                rate = run(client, workload)
+                stats = cache.stats()
+                lookups = stats["hits"] + stats["misses"]
+                hit_rate = f"{stats['hits'] / lookups:.1%}" if lookups else "-"
+                print(f"{exponent:>6} {label:>14} {rate:>8.0f} {hit_rate:>9} {stats['evictions']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Latency of ranked troubleshooting (DefectRanker) on catalogs of up to 100k
+# defects, checked against scoring every defect in plain Python.
+#
+#   python benchmarks/bench_ranking.py
+import math
+
+from common import fmt_seconds, scaled_catalog, timeit
+
+from beer_defects_app import DefectIndex, flavor_synonyms
+from defect_ranking import DefectRanker, flavor_smoothing, stage_mismatch
+
+QUERIES = [
+    ("", ["buttery", "butterscotch"]),
+    ("fermentation", ["tart", "hot", "buttery 7"]),
+    ("", ["medicinal", "band-aid", "plastic", "clove 3"]),
+    ("packaging", ["cardbord", "stale 12"]),
+]
+
+
+# Every defect's score and explained flag, one at a time
+def scan_rank(index, stage, off_flavor_list, limit=5):
+    observations = [set(terms) for terms in index.resolve_flavors(off_flavor_list).values() if terms]
+    listed = [set() for _ in index.names]
+    for term, positions in index.by_flavor.items():
+        for position in positions:
+            listed[position].add(term)
+    stages = index.stage_matches(stage) if stage else set()
+    vocabulary_size = len(index.by_flavor)
+    scored = []
+    for position, name in enumerate(index.names):
+        score = 0.0
+        explained = False
+        for terms in observations:
+            hit = bool(terms & listed[position])
+            explained = explained or hit
+            score += math.log(((1 if hit else 0) + flavor_smoothing) / (len(listed[position]) + flavor_smoothing * vocabulary_size))
+        if stage:
+            score += 0 if position in stages else math.log(stage_mismatch)
+            explained = explained or (not observations and position in stages)
+        if explained:
+            scored.append((-round(score, 9), position, name))
+    scored.sort()
+    return [name for _, _, name in scored[:limit]]
+
+
+def main():
+    print(f"{'defects':>8} {'build':>10} {'rank':>10} {'scan':>10}")
+    for size in (10, 1_000, 100_000):
+        defects = scaled_catalog(size)
+        index = DefectIndex(defects, flavor_synonyms)
+        build = timeit(lambda: DefectRanker(index), number=1, repeat=3)
+        ranker = DefectRanker(index)
+        for stage, flavors in QUERIES:
+            assert [name for name, _ in ranker.rank(stage, flavors)] == scan_rank(index, stage, flavors), (stage, flavors)
+
+        number = max(1, 10_000 // size)
+        ranked = timeit(lambda: [ranker.rank(s, f) for s, f in QUERIES], number=number) / len(QUERIES)
+        scan = timeit(lambda: [scan_rank(index, s, f) for s, f in QUERIES], number=1, repeat=1) / len(QUERIES)
+        print(f"{size:>8} {fmt_seconds(build):>10} {fmt_seconds(ranked):>10} {fmt_seconds(scan):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# Route-level benchmark: drives every route of the app through the Flask
+# test client and through a locally started gunicorn, against the real
+# catalog scaled to --size entries, with --concurrency requests in flight.
+# Throughput and p50/p95/p99 latency per route are written to --output, and
+# compared with --baseline when given: the run fails if any route got slower
+# (or lost throughput) by more than --tolerance. The panel and job routes,
+# which keep state between requests, have bench_panel.py and bench_jobs.py.
+#
+#   python benchmarks/bench_routes.py --size 1000 --concurrency 4 --output results.json
+#   python benchmarks/bench_routes.py --size 1000 --baseline results.json
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from common import scaled_catalog
+
+import beer_defects_app
+from catalog_store import catalog_version, write_sqlite
+
+ROOT = os.path.dirname(os.path.abspath(beer_defects_app.__file__))
+
+
+# (label, method, path, body, content type) for every route
+def route_requests(defects):
+    name = quote(next(iter(defects)))
+    batch = json.dumps([{"stage": "fermentation", "off_flavors": ["buttery"]}, {"off_flavors": "cardboard, stale"}] * 50)
+    rank = json.dumps({"stage": "fermentation", "off_flavors": ["buttery", "tart", "hot"]})
+    multipart_boundary = "benchmark"
+    batch_log = "\r\n".join([
+        f"--{multipart_boundary}",
+        'Content-Disposition: form-data; name="batches"; filename="log.csv"',
+        "Content-Type: text/csv",
+        "",
+        "batch,boil_time,ferment_temp\n" + "".join(f"B{i},{45 + i % 30},{64 + i % 10}\n" for i in range(500)),
+        f"--{multipart_boundary}--",
+        "",
+    ])
+    # A day of per-minute readings from two fermenters, one of which spikes
+    sensor_log = "time,vessel,temperature,gravity\n" + "".join(
+        f"2024-05-01T{minute // 60:02d}:{minute % 60:02d}:00Z,FV{vessel},"
+        f"{75 if vessel and 600 <= minute < 720 else 50},{1.050 - minute / 100_000:.4f}\n"
+        for minute in range(1440) for vessel in range(2)
+    )
+    # A page from the middle of the catalog, as a client paging through it gets
+    cursor = beer_defects_app.encode_cursor(catalog_version(defects), len(defects) // 2)
+    form = "application/x-www-form-urlencoded"
+    return [
+        ("GET /", "GET", "/", None, None),
+        ("GET /defects", "GET", "/defects", None, None),
+        ("GET /defect/<name>", "GET", f"/defect/{name}", None, None),
+        ("GET /api/defects", "GET", "/api/defects", None, None),
+        ("GET /api/defects?cursor", "GET", f"/api/defects?cursor={cursor}", None, None),
+        ("GET /api/defects?category&fields", "GET", "/api/defects?category=fermentation&fields=Off-Flavors,Category", None, None),
+        ("GET /api/defects/<name>", "GET", f"/api/defects/{name}", None, None),
+        ("GET /search", "GET", "/search?query=oxygen+exposure", None, None),
+        ("GET /troubleshoot", "GET", "/troubleshoot", None, None),
+        ("POST /troubleshoot", "POST", "/troubleshoot", "stage=fermentation&off_flavors=buttery%2C+tart", form),
+        ("POST /api/troubleshoot/batch", "POST", "/api/troubleshoot/batch", batch, "application/json"),
+        ("POST /api/troubleshoot/rank", "POST", "/api/troubleshoot/rank", rank, "application/json"),
+        ("GET /analyze", "GET", "/analyze", None, None),
+        ("POST /analyze", "POST", "/analyze", "boil_time=45&ferment_temp=72&mash_ph=6.1", form),
+        ("POST /analyze/bulk", "POST", "/analyze/bulk", batch_log, f"multipart/form-data; boundary={multipart_boundary}"),
+        ("POST /analyze/sensors", "POST", "/analyze/sensors", sensor_log, "text/csv"),
+        ("GET /export", "GET", "/export", None, None),
+        ("GET /export?format=csv", "GET", "/export?format=csv", None, None),
+        ("GET /export?format=json", "GET", "/export?format=json", None, None),
+        ("GET /export?format=ndjson", "GET", "/export?format=ndjson", None, None),
+        ("GET /metrics", "GET", "/metrics", None, None),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# Run `send` `requests` times from `concurrency` threads
+def measure(send, requests, concurrency):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(count):
+        mine = []
+        for _ in range(count):
+            start = time.perf_counter()
+            send()
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, shares))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_test_client(defects, requests, concurrency):
+    beer_defects_app.refresh_catalog(defects)
+    local = threading.local()
+    results = {}
+    for label, method, path, body, content_type in route_requests(defects):
+        def send():
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = beer_defects_app.app.test_client()
+            response = client.open(path, method=method, data=body, content_type=content_type)
+            # Streamed responses are only produced as they are read
+            response.get_data()
+            assert response.status_code == 200, (label, response.status_code)
+
+        send()  # warm caches built on first use
+        results[label] = measure(send, requests, concurrency)
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_gunicorn(defects, requests, concurrency, workers):
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "catalog.sqlite")
+        write_sqlite(defects, source)
+        port = free_port()
+        env = dict(os.environ, BEER_DEFECTS_CATALOG=source)
+        server = subprocess.Popen(
+            [shutil.which("gunicorn"), "-w", str(workers), "-b", f"127.0.0.1:{port}", "beer_defects_app:app"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            def request(method, path, body=None, content_type=None):
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+                try:
+                    headers = {"Content-Type": content_type} if content_type else {}
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    return response.status
+                finally:
+                    connection.close()
+
+            deadline = time.monotonic() + 300
+            while True:
+                try:
+                    request("GET", "/")
+                    break
+                except OSError:
+                    if time.monotonic() > deadline or server.poll() is not None:
+                        raise RuntimeError("gunicorn did not start")
+                    time.sleep(0.2)
+
+            results = {}
+            for label, method, path, body, content_type in route_requests(defects):
+                def send():
+                    status = request(method, path, body, content_type)
+                    assert status == 200, (label, status)
+
+                # Every worker builds its own lazily made caches
+                for _ in range(workers * 2):
+                    send()
+                results[label] = measure(send, requests, concurrency)
+            return results
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+
+# Descriptions of every route that regressed beyond `tolerance` (a fraction)
+def regressions(results, baseline, tolerance):
+    found = []
+    for server, routes in results.items():
+        for label, current in routes.items():
+            previous = baseline.get(server, {}).get(label)
+            if previous is None:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                if current[metric] > previous[metric] * (1 + tolerance):
+                    found.append(f"{server} {label}: {metric} {previous[metric]:.2f} -> {current[metric]:.2f}")
+            if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+                found.append(
+                    f"{server} {label}: throughput {previous['throughput_rps']:.0f} -> {current['throughput_rps']:.0f} req/s"
+                )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000, help="catalog entries (e.g. 10, 1000, 100000)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--servers", default="client,gunicorn", help="comma-separated: client, gunicorn")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction")
+    args = parser.parse_args()
+
+    defects = scaled_catalog(args.size)
+    servers = args.servers.split(",")
+    results = {}
+    if "client" in servers:
+        results["client"] = run_test_client(defects, args.requests, args.concurrency)
+    if "gunicorn" in servers:
+        if shutil.which("gunicorn"):
+            results["gunicorn"] = run_gunicorn(defects, args.requests, args.concurrency, args.workers)
+        else:
+            print("gunicorn is not installed; skipping", file=sys.stderr)
+
+    print(f"{'server':<9} {'route':<36} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for server, routes in results.items():
+        for label, result in routes.items():
+            print(
+                f"{server:<9} {label:<36} {result['throughput_rps']:>9.0f} {result['p50_ms']:>8.2f} "
+                f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+            )
+
+    report = {"size": args.size, "concurrency": args.concurrency, "requests": args.requests, "results": results}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if (baseline.get("size"), baseline.get("concurrency")) != (args.size, args.concurrency):
+            sys.exit("baseline was recorded with a different --size or --concurrency")
+        found = regressions(results, baseline["results"], args.tolerance)
+        if found:
+            sys.exit("regressions beyond {:.0%}:\n  {}".format(args.tolerance, "\n  ".join(found)))
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
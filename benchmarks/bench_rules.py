@@ -0,0 +1,62 @@
+# Cost of evaluating one recipe against the compiled RuleIndex as the number
+# of rules grows to 10k, next to checking every rule in turn.
+#
+#   python benchmarks/bench_rules.py
+import random
+
+from common import fmt_seconds, timeit
+
+from beer_defects_app import recipe_parameters
+from recipe_analysis import RuleIndex, rule_interval
+
+PARAMETERS = [field for field, _, _ in recipe_parameters]
+
+
+# Narrow range rules spread over 0-1000 for every parameter, plus some
+# one-sided thresholds
+def random_rules(count, seed=0):
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        parameter = rng.choice(PARAMETERS)
+        low = rng.uniform(0, 1000)
+        kind = rng.random()
+        if kind < 0.05:
+            rule = {"above": low}
+        elif kind < 0.1:
+            rule = {"below": low / 100}
+        else:
+            rule = {"at_least": low, "below": low + rng.uniform(0.5, 5)}
+        rules.append({"parameter": parameter, "defect": f"Defect {i}", **rule})
+    return rules
+
+
+# Every rule checked in turn, against (rule, low, high) bounds worked out
+# once up front as the index's are
+def linear(bounded_rules, values):
+    fired = []
+    for rule, low, high in bounded_rules:
+        value = values.get(rule["parameter"])
+        if value is not None and low <= value <= high:
+            fired.append(rule)
+    return fired
+
+
+def main():
+    rng = random.Random(1)
+    recipes = [{field: rng.uniform(0, 1000) for field in PARAMETERS} for _ in range(100)]
+    print(f"{'rules':>8} {'index':>10} {'linear':>10} {'avg fired':>10}")
+    for count in (10, 100, 1_000, 10_000):
+        rules = random_rules(count)
+        index = RuleIndex(rules)
+        bounded_rules = [(rule, *rule_interval(rule)) for rule in rules]
+        for recipe in recipes:
+            assert index.evaluate(recipe) == linear(bounded_rules, recipe)
+        indexed = timeit(lambda: [index.evaluate(recipe) for recipe in recipes], number=10) / len(recipes)
+        scanned = timeit(lambda: [linear(bounded_rules, recipe) for recipe in recipes], number=3, repeat=3) / len(recipes)
+        fired = sum(len(index.evaluate(recipe)) for recipe in recipes) / len(recipes)
+        print(f"{count:>8} {fmt_seconds(indexed):>10} {fmt_seconds(scanned):>10} {fired:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# Index build time and query latency of /search's BM25 index.
+#
+#   python benchmarks/bench_search.py
+import time
+
+from common import fmt_seconds, scaled_catalog, timeit
+
+from defect_search import SearchIndex
+
+QUERIES = [
+    "buttery",
+    "chlorine band-aid",
+    "oxygen exposure during packaging",
+    "yeast fermentation temperature",
+    "sanitize equipment thoroughly",
+]
+
+
+def main():
+    print(f"{'entries':>8} {'build':>10} {'query p50':>10} {'query max':>10} {'snippet':>10}")
+    for size in (1_000, 50_000, 100_000):
+        defects = scaled_catalog(size)
+        start = time.perf_counter()
+        index = SearchIndex(defects)
+        build = time.perf_counter() - start
+
+        latencies = sorted(timeit(lambda: index.search(query, limit=20), number=200) for query in QUERIES)
+        top = index.search(QUERIES[1], limit=20)
+        snippets = timeit(lambda: [index.snippet(name, QUERIES[1]) for name, _ in top], number=100)
+        print(
+            f"{size:>8} {fmt_seconds(build):>10} {fmt_seconds(latencies[len(latencies) // 2]):>10} "
+            f"{fmt_seconds(latencies[-1]):>10} {fmt_seconds(snippets):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
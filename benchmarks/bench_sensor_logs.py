@@ -0,0 +1,90 @@
+# Throughput of the streaming sensor log check (sensor_logs.py) in rows/sec,
+# on a synthetic month of per-minute readings from --vessels fermenters, as
+# CSV and as JSON lines. The peak RSS of the command line tool on the same
+# log shows memory stays bounded by the chunk size rather than the log size.
+#
+#   python benchmarks/bench_sensor_logs.py --vessels 24 --days 30
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import common  # noqa: F401  (puts the repo on sys.path)
+
+import numpy as np
+import pandas as pd
+
+import sensor_logs
+from sensor_logs import analyze_sensor_log
+
+
+# Lagers at 50°F with a diacetyl rest and crash on most vessels, a spike on
+# some, and a packaged event at the end of each. Rows are in time order
+# across vessels, as a logger writes them.
+def write_log(path, vessels, days, file_format):
+    minutes = days * 24 * 60
+    start = pd.Timestamp("2024-05-01", tz="UTC")
+    times = (start + pd.to_timedelta(np.arange(minutes), unit="min")).strftime("%Y-%m-%dT%H:%M:%SZ")
+    hours = np.arange(minutes) / 60
+    rng = np.random.default_rng(15)
+    first = True
+    # Written a day at a time so generating a long log stays in bounded memory
+    for day in range(days):
+        rows = slice(day * 1440, (day + 1) * 1440)
+        frames = []
+        for vessel in range(vessels):
+            temperature = np.full(1440, 50.0) + rng.normal(0, 0.3, 1440)
+            hour = hours[rows]
+            if vessel % 4:
+                temperature[(hour >= 8 * 24) & (hour < 10 * 24)] += 12
+            temperature[hour >= 10 * 24] = 34 + rng.normal(0, 0.3, (hour >= 10 * 24).sum())
+            if vessel % 5 == 0:
+                temperature[(hour >= 3 * 24) & (hour < 3 * 24 + 2)] = 75
+            gravity = 1.050 - 0.040 * np.minimum(hour / (7 * 24 if vessel % 3 else 25 * 24), 1)
+            event = np.where(np.arange(rows.start, rows.stop) == minutes - 1, "packaged", "")
+            frames.append(pd.DataFrame({
+                "time": times[rows], "vessel": f"FV{vessel:02d}", "temperature": temperature.round(2),
+                "gravity": gravity.round(4), "event": event,
+            }))
+        frame = pd.concat(frames).sort_values("time", kind="stable")
+        if file_format == "csv":
+            frame.to_csv(path, mode="w" if first else "a", header=first, index=False)
+        else:
+            with open(path, "w" if first else "a") as output:
+                frame.to_json(output, orient="records", lines=True)
+        first = False
+    return vessels * minutes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vessels", type=int, default=24)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--formats", default="csv,jsonl")
+    args = parser.parse_args()
+
+    print(f"{'format':<6} {'rows':>11} {'size':>9} {'findings':>9} {'rows/s':>11} {'CLI peak RSS':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format in args.formats.split(","):
+            path = os.path.join(directory, f"sensors.{file_format}")
+            rows = write_log(path, args.vessels, args.days, file_format)
+            start = time.perf_counter()
+            with open(path, "rb") as source:
+                findings = sum(1 for line in analyze_sensor_log(source, file_format) if "summary" not in line)
+            elapsed = time.perf_counter() - start
+            subprocess.run(
+                [sys.executable, sensor_logs.__file__, path, "--format", file_format],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+            peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+            print(
+                f"{file_format:<6} {rows:>11,} {os.path.getsize(path) / 2**20:>7.0f}MB {findings:>9} "
+                f"{rows / elapsed:>11,.0f} {peak:>11.0f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Cold-start budget: how long importing the app takes, whether it pulled in
+# the heavy libraries, and the memory of each gunicorn worker with and
+# without preloading. Exits non-zero when a number goes over its budget.
+#
+#   python benchmarks/bench_startup.py [--import-budget-ms 400] [--pss-budget-mb 80]
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import common
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(common.__file__)))
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import beer_defects_app
+print(time.perf_counter() - start, json.dumps([name for name in ("pandas", "openpyxl", "numpy") if name in sys.modules]))
+"""
+
+
+def import_time(runs):
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.split(maxsplit=1)
+        times.append(float(output[0]))
+    return statistics.median(times), json.loads(output[1])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def proc_kb(pid, filename, field):
+    with open(f"/proc/{pid}/{filename}") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def worker_memory(workers, preload):
+    port = free_port()
+    env = dict(os.environ, BEER_DEFECTS_PRELOAD="1" if preload else "0")
+    master = subprocess.Popen(
+        [shutil.which("gunicorn"), "-w", str(workers), "-b", f"127.0.0.1:{port}", "beer_defects_app:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        # Touch the search index and an export so every worker has built or
+        # imported what it needs
+        for _ in range(workers * 10):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/search?query=yeast").read()
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/export?format=csv").read()
+        with open(f"/proc/{master.pid}/task/{master.pid}/children") as children:
+            pids = [int(pid) for pid in children.read().split()]
+        return [
+            {"rss_mb": proc_kb(pid, "status", "VmRSS") / 1024, "pss_mb": proc_kb(pid, "smaps_rollup", "Pss") / 1024}
+            for pid in pids
+        ]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--import-budget-ms", type=float, default=400)
+    parser.add_argument("--pss-budget-mb", type=float, default=80)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    seconds, heavy = import_time(args.runs)
+    print(f"import beer_defects_app: {seconds * 1000:.0f} ms (heavy modules loaded: {heavy or 'none'})")
+    if seconds * 1000 > args.import_budget_ms:
+        failures.append(f"import took {seconds * 1000:.0f} ms, budget {args.import_budget_ms:.0f} ms")
+    if "pandas" in heavy or "openpyxl" in heavy:
+        failures.append("importing the app loaded pandas/openpyxl")
+
+    results = {"import_ms": seconds * 1000, "heavy_modules": heavy}
+    if shutil.which("gunicorn") and os.path.exists("/proc/self/smaps_rollup"):
+        for preload in (False, True):
+            memory = worker_memory(args.workers, preload)
+            label = "preload" if preload else "no preload"
+            rss = statistics.mean(worker["rss_mb"] for worker in memory)
+            pss = statistics.mean(worker["pss_mb"] for worker in memory)
+            print(f"{label:>10}: {len(memory)} workers, mean RSS {rss:.1f} MB, mean PSS {pss:.1f} MB")
+            results[label] = memory
+            if pss > args.pss_budget_mb:
+                failures.append(f"{label}: mean worker PSS {pss:.1f} MB, budget {args.pss_budget_mb:.0f} MB")
+    else:
+        print("gunicorn or /proc/<pid>/smaps_rollup not available; skipping worker memory")
+
+    print(json.dumps(results))
+    if failures:
+        sys.exit("over budget: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Requests/sec for the HTML routes when every hit compiles its template with
+# render_template_string, compared with the compiled templates and
+# pre-rendered pages the app now serves.
+#
+#   python benchmarks/bench_templates.py
+from common import timeit
+
+from flask import render_template_string
+
+import beer_defects_app
+from beer_defects_app import app, catalog
+
+NAME = next(iter(catalog.defects))
+
+
+# The routes as they were before templates were compiled at startup
+def home_before():
+    return render_template_string(beer_defects_app.home_template)
+
+
+def defects_before():
+    return render_template_string(beer_defects_app.defects_template, defects=catalog.defects)
+
+
+def defect_before():
+    return render_template_string(beer_defects_app.defect_template, defect_name=NAME, defect=catalog.defects[NAME])
+
+
+def troubleshoot_before():
+    return render_template_string(beer_defects_app.troubleshooting_template, stage="", off_flavors="", matches={})
+
+
+CASES = [
+    ("/", home_before, beer_defects_app.home),
+    ("/defects", defects_before, beer_defects_app.list_defects),
+    (f"/defect/{NAME}", defect_before, lambda: beer_defects_app.defect_detail(NAME)),
+    ("/troubleshoot", troubleshoot_before, beer_defects_app.troubleshoot),
+]
+
+
+def main():
+    print(f"{'route':<24} {'before req/s':>13} {'after req/s':>12} {'speedup':>8}")
+    for path, before, after in CASES:
+        with app.test_request_context(path):
+            old = timeit(before, number=500)
+            new = timeit(after, number=500)
+        print(f"{path:<24} {1 / old:>13.0f} {1 / new:>12.0f} {old / new:>7.0f}x")
+
+    # End to end through the WSGI stack, where routing and response
+    # handling are paid on both sides
+    client = app.test_client()
+    for path, _, _ in CASES:
+        seconds = timeit(lambda: client.get(path), number=500)
+        print(f"{path:<24} {'test client':>13} {1 / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# Compare the full-scan troubleshoot matching with DefectIndex.
+#
+#   python benchmarks/bench_troubleshoot.py
+from common import fmt_seconds, scaled_catalog, timeit
+
+from beer_defects_app import DefectIndex
+
+QUERIES = [
+    ("fermentation", ["buttery"]),
+    ("", ["medicinal", "band-aid"]),
+    ("packaging", []),
+    ("boil", ["cooked corn"]),
+]
+
+
+# The matching loop troubleshoot() used before the index.
+def full_scan(defects, stage, off_flavor_list):
+    matches = {}
+    for name, details in defects.items():
+        matches_stage = not stage or stage in details.get("Brewing Stage", "").lower()
+        matches_flavor = not off_flavor_list or any(flavor in map(str.lower, details.get("Off-Flavors", [])) for flavor in off_flavor_list)
+        if matches_stage and matches_flavor:
+            matches[name] = details
+    return matches
+
+
+def main():
+    print(f"{'entries':>8} {'scan':>10} {'index':>10} {'speedup':>8}")
+    for size in (10, 1_000, 100_000):
+        defects = scaled_catalog(size)
+        index = DefectIndex(defects)
+        for stage, flavors in QUERIES:
+            assert list(full_scan(defects, stage, flavors)) == index.match(stage, flavors)
+
+        number = max(1, 10_000 // size)
+        scan = timeit(lambda: [full_scan(defects, s, f) for s, f in QUERIES], number=number)
+        indexed = timeit(lambda: [index.match(s, f) for s, f in QUERIES], number=number)
+        print(f"{size:>8} {fmt_seconds(scan):>10} {fmt_seconds(indexed):>10} {scan / indexed:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
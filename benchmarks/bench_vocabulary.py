@@ -0,0 +1,71 @@
+# Off-flavor lookup against vocabularies of up to tens of thousands of terms:
+# building the vocabulary (trigram index included) and the trigram index
+# alone, exact and synonym lookups, and typo lookups through the trigram
+# index against comparing with every term.
+#
+#   python benchmarks/bench_vocabulary.py
+import random
+
+from common import fmt_seconds, timeit
+
+from flavor_vocabulary import FlavorVocabulary, edit_distance, edit_limit, term_key
+
+SYLLABLES = ["ba", "ter", "cor", "me", "dic", "al", "sol", "vent", "pa", "per", "tin", "ny", "clo", "ve", "sta", "le",
+             "ro", "mu", "sky", "fru", "it", "gra", "ss", "hop", "ma", "lt", "to", "ast", "ci", "trus"]
+
+
+def vocabulary_terms(size, rng):
+    terms = set()
+    while len(terms) < size:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 2))]
+        terms.add(" ".join(words))
+    return sorted(terms)
+
+
+def typo(term, rng):
+    position = rng.randrange(len(term))
+    return term[:position] + rng.choice("abcdefghijklmnopqrstuvwxyz") + term[position + 1:]
+
+
+# What nearest_keys() finds, by comparing with every key
+def scan_lookup(vocabulary, text):
+    key = term_key(text)
+    limit = edit_limit(key)
+    best, nearest = limit + 1, []
+    for candidate in vocabulary.keys:
+        distance = edit_distance(key, candidate, best)
+        if distance < best:
+            best, nearest = distance, [candidate]
+        elif distance == best and distance <= limit:
+            nearest.append(candidate)
+    terms = []
+    for found in nearest:
+        terms.extend(term for term in vocabulary.by_key[found] if term not in terms)
+    return terms
+
+
+def main():
+    rng = random.Random(13)
+    print(f"{'terms':>7} {'build':>10} {'trigrams':>10} {'exact':>10} {'typo':>10} {'typo scan':>10}")
+    for size in (100, 10_000, 50_000):
+        terms = vocabulary_terms(size, rng)
+        synonyms = {f"alias {i}": term for i, term in enumerate(rng.sample(terms, min(size, 1_000)))}
+        build = timeit(lambda: FlavorVocabulary(terms, synonyms), number=1, repeat=3)
+        vocabulary = FlavorVocabulary(terms, synonyms)
+        trigram_build = timeit(vocabulary.build_trigram_index, number=1, repeat=3)
+
+        exact_queries = rng.sample(terms, 100)
+        typo_queries = [typo(term, rng) for term in rng.sample(terms, 100)]
+        typo_queries = [query for query in typo_queries if term_key(query) not in vocabulary.by_key]
+        for query in typo_queries[:20]:
+            assert vocabulary.lookup(query) == scan_lookup(vocabulary, query), query
+
+        exact = timeit(lambda: [vocabulary.lookup(query) for query in exact_queries], number=10) / len(exact_queries)
+        fuzzy = timeit(lambda: [vocabulary.lookup(query) for query in typo_queries], number=1, repeat=3) / len(typo_queries)
+        scan = timeit(lambda: [scan_lookup(vocabulary, query) for query in typo_queries[:5]], number=1, repeat=1) / 5
+        print(f"{size:>7} {fmt_seconds(build):>10} {fmt_seconds(trigram_build):>10} {fmt_seconds(exact):>10} "
+              f"{fmt_seconds(fuzzy):>10} {fmt_seconds(scan):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# Shared helpers for the benchmark scripts in this directory.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beer_defects_app import flavor_defects
+
+
+# The real catalog repeated until it has `size` entries. Copies get a numbered
+# suffix on their name and off-flavors so lookups stay selective.
+def scaled_catalog(size):
+    base = list(flavor_defects.items())
+    catalog = {}
+    for i in range(size):
+        name, details = base[i % len(base)]
+        copy = i // len(base)
+        if copy:
+            details = dict(details)
+            details["Off-Flavors"] = [f"{flavor} {copy}" for flavor in details.get("Off-Flavors", [])]
+            name = f"{name} {copy}"
+        catalog[name] = details
+    return catalog
+
+
+# Best-of-`repeat` seconds per call of `func`.
+def timeit(func, number=100, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def fmt_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
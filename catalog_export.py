@@ -0,0 +1,117 @@
+# /export files written a defect at a time, so a download takes the same
+# memory whatever the catalog's size, and CSV and JSON start arriving before
+# the last defect is written. Rows have the defect name first and one column
+# per field, the layout catalog_store reads back; list fields (Off-Flavors,
+# Solutions, Prevention) are flattened into one cell as a JSON list.
+#
+# Files written by the earlier pandas exporter differ in two ways that
+# matter to anyone parsing them: CSV and XLSX list cells held Python reprs
+# (['Buttery']) rather than JSON (["Buttery"]), and JSON gave every defect
+# every field, with null for the ones it lacks, where a defect now only has
+# its own fields. catalog_store reads both kinds of list cell.
+import csv
+import io
+import itertools
+import json
+import tempfile
+
+# Bytes gathered before a chunk is handed to the response
+chunk_size = 64 * 1024
+
+# json.dumps with options builds a new encoder on every call
+encode_json = json.JSONEncoder(ensure_ascii=False).encode
+
+# Every field name in the catalog, in order of first use
+def export_fields(defects):
+    fields = {}
+    for details in defects.values():
+        fields.update(dict.fromkeys(details))
+    return list(fields)
+
+def cell(value):
+    if isinstance(value, (list, dict)):
+        return encode_json(value)
+    return value
+
+# [name, field values...] of each defect, with None for missing fields
+def export_rows(defects, fields):
+    for name, details in defects.items():
+        yield [name] + [cell(details.get(field)) for field in fields]
+
+# Small pieces joined into chunks of about chunk_size bytes
+def chunked(pieces):
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+def csv_chunks(defects):
+    fields = export_fields(defects)
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for row in itertools.chain([[""] + fields], export_rows(defects, fields)):
+            writer.writerow(row)
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+
+    return generate()
+
+# One {"name": ..., field: value, ...} object per line
+def ndjson_chunks(defects):
+    def lines():
+        for name, details in defects.items():
+            yield (encode_json(dict({"name": name}, **details)) + "\n").encode("utf-8")
+
+    return chunked(lines())
+
+# One object of name -> fields, as the pandas "index" orientation writes it
+def json_chunks(defects):
+    def pieces():
+        yield b"{"
+        for position, (name, details) in enumerate(defects.items()):
+            entry = encode_json(name) + ":" + encode_json(dict(details))
+            yield (b"," if position else b"") + entry.encode("utf-8")
+        yield b"}"
+
+    return chunked(pieces())
+
+# openpyxl's write-only mode keeps rows in a temporary file rather than in
+# memory. A workbook is a zip whose directory comes last, so it is only sent
+# once complete.
+def xlsx_chunks(defects):
+    from openpyxl import Workbook
+
+    fields = export_fields(defects)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append([None] + fields)
+    for row in export_rows(defects, fields):
+        sheet.append(row)
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        yield from iter(lambda: output.read(chunk_size), b"")
+
+# Formats written a defect at a time
+export_writers = {
+    "csv": csv_chunks,
+    "ndjson": ndjson_chunks,
+    "json": json_chunks,
+    "xlsx": xlsx_chunks,
+}
+
+# Formats whose output arrives as it is written. An XLSX download can't
+# start before the workbook is complete.
+streamed_formats = {"csv", "ndjson", "json"}
@@ -0,0 +1,185 @@
+# Loading the defects catalog from an xlsx workbook or a SQLite database.
+# Parsed catalogs are cached in a pickle snapshot next to the source, keyed
+# by the source's mtime, size and content hash, so worker boots skip the
+# parse while the source is unchanged. A compact catalog has its own
+# snapshot, mapped read-only instead of unpickled.
+import ast
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import struct
+import tempfile
+
+from compact_catalog import CompactCatalog, write_compact
+
+# Columns holding lists; stored as JSON (or Python) list literals
+list_fields = ["Off-Flavors", "Solutions", "Prevention"]
+
+sqlite_suffixes = (".db", ".sqlite", ".sqlite3")
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def parse_list(value):
+    if isinstance(value, str) and value.lstrip().startswith("["):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return ast.literal_eval(value)
+    return value
+
+# One catalog entry from a row of column -> value. Empty cells are left out,
+# like the keys missing from entries in the built-in catalog.
+def defect_from_row(row):
+    defect = {}
+    for column, value in row.items():
+        if value is None or value == "" or (isinstance(value, float) and value != value):
+            continue
+        defect[column] = parse_list(value) if column in list_fields else value
+    return defect
+
+# Workbook layout written by /export: defect names in the first column, one
+# column per field
+def read_xlsx(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        defects = {}
+        if header is None:
+            return defects
+        for row in rows:
+            if row and row[0] is not None:
+                defects[str(row[0])] = defect_from_row(dict(zip(header[1:], row[1:])))
+        return defects
+    finally:
+        workbook.close()
+
+# A `defects` table with a `name` column followed by one column per field
+def read_sqlite(path):
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = connection.execute("SELECT * FROM defects ORDER BY rowid")
+        columns = [description[0] for description in cursor.description]
+        defects = {}
+        for row in cursor:
+            row = dict(zip(columns, row))
+            name = str(row.pop("name"))
+            defects[name] = defect_from_row(row)
+        return defects
+    finally:
+        connection.close()
+
+def write_sqlite(defects, path):
+    columns = []
+    for details in defects.values():
+        for column in details:
+            if column not in columns:
+                columns.append(column)
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            quoted = ", ".join(f'"{column}"' for column in columns)
+            connection.execute("DROP TABLE IF EXISTS defects")
+            connection.execute(f"CREATE TABLE defects (name TEXT PRIMARY KEY, {quoted})")
+            placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+            connection.executemany(
+                f"INSERT INTO defects (name, {quoted}) VALUES ({placeholders})",
+                [
+                    [name] + [
+                        json.dumps(details[column]) if isinstance(details.get(column), list) else details.get(column)
+                        for column in columns
+                    ]
+                    for name, details in defects.items()
+                ],
+            )
+    finally:
+        connection.close()
+
+def read_source(path):
+    if path.lower().endswith(".xlsx"):
+        return read_xlsx(path)
+    if path.lower().endswith(sqlite_suffixes):
+        return read_sqlite(path)
+    raise ValueError(f"Unsupported catalog source: {path}")
+
+# Fingerprint of a catalog's contents, used to tell versions apart
+def catalog_version(defects):
+    if isinstance(defects, CompactCatalog):
+        return defects.version
+    encoded = json.dumps(defects, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+def snapshot_path(path):
+    return path + ".snapshot"
+
+def compact_snapshot_path(path):
+    return path + ".compact"
+
+def snapshot_key(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return source_stamp(path), digest.hexdigest()
+
+# The catalog stored at `path`, from its snapshot when that is still current.
+# With `compact` it comes back as a CompactCatalog.
+def load_defects(path, use_snapshot=True, compact=False):
+    if compact:
+        return load_compact(path, use_snapshot)
+    if not use_snapshot:
+        return read_source(path)
+
+    key = snapshot_key(path)
+    try:
+        with open(snapshot_path(path), "rb") as snapshot:
+            cached = pickle.load(snapshot)
+        if cached["key"] == key:
+            return cached["defects"]
+    except (OSError, EOFError, KeyError, TypeError, pickle.UnpicklingError):
+        pass
+
+    defects = read_source(path)
+    # Written to a temporary file and renamed so concurrent workers never
+    # read a partial snapshot. A read-only directory just means no snapshot.
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False) as snapshot:
+            pickle.dump({"key": key, "defects": defects}, snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        return defects
+    try:
+        os.replace(snapshot.name, snapshot_path(path))
+    except OSError:
+        os.unlink(snapshot.name)
+    return defects
+
+# A CompactCatalog mapped from the compact snapshot of `path`, which is
+# written first when missing or out of date
+def load_compact(path, use_snapshot=True):
+    if not use_snapshot:
+        defects = read_source(path)
+        return CompactCatalog.from_defects(defects, catalog_version(defects))
+
+    # Compared as it reads back from the snapshot's JSON
+    key = json.loads(json.dumps(snapshot_key(path)))
+    try:
+        cached = CompactCatalog.open(compact_snapshot_path(path))
+        if cached.key == key:
+            return cached
+    except (OSError, ValueError, KeyError, struct.error):
+        pass
+
+    defects = read_source(path)
+    try:
+        write_compact(defects, compact_snapshot_path(path), catalog_version(defects), key)
+        return CompactCatalog.open(compact_snapshot_path(path))
+    except OSError:
+        # A read-only directory just means the catalog stays in this process
+        return CompactCatalog.from_defects(defects, catalog_version(defects), key)
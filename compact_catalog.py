@@ -0,0 +1,277 @@
+# A compact, read-only form of the defects catalog. Every distinct string
+# (names, field names, stages, categories, off-flavor terms, ...) is stored
+# once in a string table and defects refer to strings by id through flat
+# uint32 arrays, so a catalog is a few buffers instead of a dict per defect,
+# a list per field and a copy of "Fermentation" in every entry. The buffers
+# can be written to a snapshot file that every gunicorn worker maps
+# read-only, so the workers share one copy of the defect data in the page
+# cache.
+#
+# That is only the raw data. The app still pre-renders every page and builds
+# its indexes and API JSON from it in each worker, and those dominate a
+# worker's memory: at 100k defects a warmed worker adds about 600 MB either
+# way, only some 10% less than with dicts. Every value is also decoded on
+# access, so lookups and walks of the whole catalog are 10-100x slower.
+#
+# CompactCatalog is a read-only Mapping of name -> DefectView, itself a
+# Mapping of field -> value, so code written against the nested dicts of
+# `flavor_defects` works with either.
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections.abc import ItemsView, Mapping, ValuesView
+
+magic = b"BDCCAT01"
+
+# magic, string count, field count, defect count, entry count, item count,
+# string bytes
+header = struct.Struct("<8sIIIIIQ")
+
+# Entry counts above any real list length mark a single value: a string, or
+# JSON text for anything else (numbers, None, lists holding non-strings)
+text_value = 0xFFFFFFFF
+json_value = 0xFFFFFFFE
+
+# Layout after the header, all uint32 arrays but the string bytes at the end:
+#   string_offsets   strings + 1 offsets of the strings from the start
+#   field_names      string id of each distinct field name
+#   defect_names     string id of each defect's name, in catalog order
+#   name_order       defect positions sorted by name, for lookups
+#   defect_entries   defects + 1 offsets into the entry arrays
+#   entry_fields     string id of each entry's field name
+#   entry_starts     first item of a list, or the string id of a value
+#   entry_counts     list length, or text_value / json_value
+#   items            string ids of list items
+# String 0 is JSON metadata: the catalog version and the key of the source
+# the snapshot was made from.
+
+def pack(defects, version, key=None):
+    strings = {}
+    def string_id(text):
+        found = strings.get(text)
+        if found is None:
+            found = strings[text] = len(strings)
+        return found
+
+    string_id(json.dumps({"version": version, "key": key}))
+    field_names = {}
+    names = array("I")
+    entries = array("I", [0])
+    fields, starts, counts, items = array("I"), array("I"), array("I"), array("I")
+    for name, details in defects.items():
+        names.append(string_id(str(name)))
+        for field, value in details.items():
+            field_id = string_id(field)
+            field_names[field_id] = None
+            fields.append(field_id)
+            if isinstance(value, str):
+                starts.append(string_id(value))
+                counts.append(text_value)
+            elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+                starts.append(len(items))
+                counts.append(len(value))
+                items.extend(string_id(item) for item in value)
+            else:
+                starts.append(string_id(json.dumps(value, ensure_ascii=False)))
+                counts.append(json_value)
+        entries.append(len(fields))
+
+    decoded = list(strings)
+    order = array("I", sorted(range(len(names)), key=lambda position: decoded[names[position]]))
+    sections = [
+        array("I", field_names), names, order, entries, fields, starts, counts, items,
+    ]
+
+    # Offsets are from the start of the buffer, so reading a string is one
+    # slice of it
+    encoded = [text.encode("utf-8") for text in strings]
+    total = header.size + 4 * (len(strings) + 1 + sum(len(section) for section in sections))
+    offsets = array("I", [total])
+    for data in encoded:
+        total += len(data)
+        if total >= 1 << 32:
+            raise ValueError("catalog too large for a compact snapshot")
+        offsets.append(total)
+
+    return b"".join([
+        header.pack(magic, len(strings), len(field_names), len(names), len(fields), len(items), total - offsets[0]),
+        offsets.tobytes(), *(section.tobytes() for section in sections), *encoded,
+    ])
+
+class CompactCatalog(Mapping):
+    # `buffer` is what pack() returned, or a read-only map of a file holding it
+    def __init__(self, buffer, path=None):
+        self.buffer = buffer
+        self.path = path
+        view = memoryview(buffer)
+        found, string_count, field_count, defect_count, entry_count, item_count, string_bytes = header.unpack_from(view)
+        if found != magic:
+            raise ValueError("not a compact catalog")
+        arrays = string_count + 1 + field_count + 3 * defect_count + 1 + 3 * entry_count + item_count
+        if len(view) != header.size + 4 * arrays + string_bytes:
+            raise ValueError("truncated compact catalog")
+
+        position = header.size
+        def section(count):
+            nonlocal position
+            start = position
+            position += 4 * count
+            return view[start:position].cast("I")
+
+        self.string_offsets = section(string_count + 1)
+        field_names = section(field_count)
+        self.defect_names = section(defect_count)
+        self.name_order = section(defect_count)
+        self.defect_entries = section(defect_count + 1)
+        self.entry_fields = section(entry_count)
+        self.entry_starts = section(entry_count)
+        self.entry_counts = section(entry_count)
+        self.list_items = section(item_count)
+
+        # field name -> string id, so a field is found in a defect by
+        # comparing ids rather than decoding every field name
+        self.field_ids = {self.string(string_id): string_id for string_id in field_names}
+
+        metadata = json.loads(self.string(0))
+        self.version = metadata["version"]
+        self.key = metadata["key"]
+
+    @classmethod
+    def from_defects(cls, defects, version, key=None):
+        return cls(pack(defects, version, key))
+
+    # A snapshot file mapped read-only; the pages are shared with every other
+    # process mapping the same file
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as source:
+            buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, path)
+
+    # Pool processes get the snapshot's path instead of a copy of its contents
+    def __reduce__(self):
+        if self.path is not None:
+            return (CompactCatalog.open, (self.path,))
+        return (CompactCatalog, (bytes(self.buffer),))
+
+    def string(self, string_id):
+        return self.buffer[self.string_offsets[string_id]:self.string_offsets[string_id + 1]].decode("utf-8")
+
+    def name(self, position):
+        return self.string(self.defect_names[position])
+
+    def position(self, name):
+        if not isinstance(name, str):
+            return None
+        found = bisect_left(self.name_order, name, key=self.name)
+        if found < len(self.name_order) and self.name(self.name_order[found]) == name:
+            return self.name_order[found]
+        return None
+
+    def value(self, entry):
+        start = self.entry_starts[entry]
+        count = self.entry_counts[entry]
+        if count == text_value:
+            return self.string(start)
+        if count == json_value:
+            return json.loads(self.string(start))
+        buffer, offsets = self.buffer, self.string_offsets
+        return [buffer[offsets[item]:offsets[item + 1]].decode("utf-8") for item in self.list_items[start:start + count]]
+
+    def __getitem__(self, name):
+        position = self.position(name)
+        if position is None:
+            raise KeyError(name)
+        return DefectView(self, position)
+
+    def __contains__(self, name):
+        return self.position(name) is not None
+
+    def __iter__(self):
+        return (self.name(position) for position in range(len(self)))
+
+    def __len__(self):
+        return len(self.defect_names)
+
+    # Walked in catalog order by position, without a name lookup per defect
+    def items(self):
+        return CompactItems(self)
+
+    def values(self):
+        return CompactValues(self)
+
+class CompactItems(ItemsView):
+    def __iter__(self):
+        catalog = self._mapping
+        for position in range(len(catalog)):
+            yield catalog.name(position), DefectView(catalog, position)
+
+class CompactValues(ValuesView):
+    def __iter__(self):
+        catalog = self._mapping
+        for position in range(len(catalog)):
+            yield DefectView(catalog, position)
+
+# One defect of a CompactCatalog. Values are decoded on each access; lists
+# come back as new lists, so changing one doesn't change the catalog.
+class DefectView(Mapping):
+    __slots__ = ("catalog", "position")
+
+    def __init__(self, catalog, position):
+        self.catalog = catalog
+        self.position = position
+
+    def entries(self):
+        return range(self.catalog.defect_entries[self.position], self.catalog.defect_entries[self.position + 1])
+
+    def __getitem__(self, field):
+        catalog = self.catalog
+        field_id = catalog.field_ids.get(field)
+        if field_id is not None:
+            for entry in self.entries():
+                if catalog.entry_fields[entry] == field_id:
+                    return catalog.value(entry)
+        raise KeyError(field)
+
+    def __iter__(self):
+        return (self.catalog.string(self.catalog.entry_fields[entry]) for entry in self.entries())
+
+    def __len__(self):
+        return len(self.entries())
+
+    def items(self):
+        return DefectItems(self)
+
+    def values(self):
+        return DefectValues(self)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+class DefectItems(ItemsView):
+    def __iter__(self):
+        catalog = self._mapping.catalog
+        for entry in self._mapping.entries():
+            yield catalog.string(catalog.entry_fields[entry]), catalog.value(entry)
+
+class DefectValues(ValuesView):
+    def __iter__(self):
+        catalog = self._mapping.catalog
+        for entry in self._mapping.entries():
+            yield catalog.value(entry)
+
+# Write pack()'s output to `path`, through a temporary file renamed into
+# place so processes that have the old snapshot mapped keep reading it
+def write_compact(defects, path, version, key=None):
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False) as output:
+        output.write(pack(defects, version, key))
+    try:
+        os.replace(output.name, path)
+    except OSError:
+        os.unlink(output.name)
+        raise
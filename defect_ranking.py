@@ -0,0 +1,102 @@
+# Ranking defects by how well they explain everything a panel observed,
+# with a naive Bayes model over the catalog's off-flavor terms
+import math
+
+# Imported in DefectRanker so the app doesn't pay for numpy until the first
+# ranked lookup.
+
+# Defects returned by default
+rank_limit = 5
+
+# Add-alpha smoothing of P(term | defect), so a defect missing one of the
+# observed flavors is less likely rather than ruled out
+flavor_smoothing = 0.1
+
+# P(stage | defect) for a defect in another stage than the one entered
+stage_mismatch = 0.05
+
+# Naive Bayes with a uniform prior: a defect's score is
+#     log P(d) + log P(stage | d) + sum of log P(term | d) over observed terms
+# where P(term | d) is (1 + alpha) / (n_d + alpha * V) when d lists the term
+# and alpha / (n_d + alpha * V) when it doesn't. The defect x term likelihood
+# matrix therefore has one value for every listed term and a per-defect
+# value elsewhere; it is kept as sparse columns (term -> defects listing it)
+# plus that per-defect vector.
+class DefectRanker:
+    def __init__(self, index):
+        import numpy as np
+
+        self.index = index
+        self.names = index.names
+        # term -> positions of the defects listing it, as arrays made on
+        # first use of each term
+        self.columns = {}
+
+        listed = [0] * len(self.names)
+        for positions in index.by_flavor.values():
+            for position in positions:
+                listed[position] += 1
+        listed = np.array(listed, dtype=np.float64)
+        vocabulary_size = max(len(index.by_flavor), 1)
+        # log P(term | d) for a term d doesn't list, and how much listing it adds
+        self.unlisted = np.log(flavor_smoothing) - np.log(listed + flavor_smoothing * vocabulary_size)
+        self.listed_bonus = math.log((1 + flavor_smoothing) / flavor_smoothing)
+
+    def column(self, term):
+        import numpy as np
+
+        positions = self.columns.get(term)
+        if positions is None:
+            positions = self.columns[term] = np.fromiter(self.index.by_flavor[term], dtype=np.int32)
+        return positions
+
+    # The `limit` defects most likely to cause what was observed, best first,
+    # as (name, probability) pairs. Only defects matching the stage or at
+    # least one off-flavor are returned; probabilities are over all defects.
+    def rank(self, stage, off_flavor_list, limit=rank_limit):
+        import numpy as np
+
+        # Entries that matched no catalog term say nothing about any defect
+        observations = [terms for terms in self.index.resolve_flavors(off_flavor_list).values() if terms]
+        scores = np.zeros(len(self.names), dtype=np.float64)
+        explained = np.zeros(len(self.names), dtype=bool)
+        for terms in observations:
+            scores += self.unlisted
+            columns = [self.column(term) for term in terms]
+            if columns:
+                # An entry read as several terms counts once per defect
+                positions = np.unique(np.concatenate(columns))
+                scores[positions] += self.listed_bonus
+                explained[positions] = True
+        if stage:
+            stage_positions = np.fromiter(self.index.stage_matches(stage), dtype=np.int32)
+            scores += math.log(stage_mismatch)
+            scores[stage_positions] -= math.log(stage_mismatch)
+            # With flavors entered the stage only reorders the defects
+            # explaining them
+            if not observations:
+                explained[stage_positions] = True
+        if not observations and not stage:
+            return []
+
+        # Equal scores summed in a different order can differ in the last
+        # bits; rounding lets them tie and keep catalog order
+        scores = np.round(scores, 9)
+
+        # Posterior over all defects, computed stably from log scores
+        probabilities = np.exp(scores - scores.max())
+        probabilities /= probabilities.sum()
+
+        candidates = np.flatnonzero(explained)
+        if limit <= 0 or not len(candidates):
+            return []
+        if len(candidates) > limit:
+            candidate_scores = scores[candidates]
+            top = np.argpartition(-candidate_scores, limit - 1)[:limit]
+            cutoff = candidate_scores[top].min()
+            # Ties at the cut keep catalog order
+            above = candidates[candidate_scores > cutoff]
+            ties = candidates[candidate_scores == cutoff][:limit - len(above)]
+            candidates = np.concatenate([above, ties])
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(self.names[position], float(probabilities[position])) for position in candidates]
@@ -0,0 +1,125 @@
+# Full-text search over the defects catalog, ranked with BM25
+import math
+import re
+from collections import Counter
+
+from markupsafe import Markup, escape
+
+# Text fields searched for each defect, in the order snippets are taken from
+search_fields = ["Chemical Makeup", "Origins", "Off-Flavors", "Solutions", "Prevention"]
+
+token_pattern = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    return token_pattern.findall(text.lower())
+
+# The searchable text of one defect: its name, then each field. List fields
+# contribute one entry per item so snippets never run across items.
+def defect_texts(name, details):
+    yield name
+    for field in search_fields:
+        value = details.get(field)
+        if isinstance(value, list):
+            yield from value
+        elif value:
+            yield value
+
+# Inverted index with each posting's BM25 weight precomputed, so a query only
+# has to add up the weights of its terms.
+class SearchIndex:
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, defects):
+        # Imported here so the app doesn't pay for numpy until the first search
+        import numpy as np
+
+        self.defects = defects
+        self.names = list(defects)
+
+        doc_ids = {}
+        term_freqs = {}
+        lengths = []
+        for doc, (name, details) in enumerate(defects.items()):
+            tokens = []
+            for text in defect_texts(name, details):
+                tokens.extend(tokenize(text))
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                doc_ids.setdefault(term, []).append(doc)
+                term_freqs.setdefault(term, []).append(tf)
+
+        lengths = np.array(lengths, dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) else 0.0
+        # Per-document part of the BM25 denominator
+        norms = self.k1 * (1 - self.b + self.b * lengths / (average_length or 1.0))
+
+        # term -> (document ids, BM25 weight of the term in each document),
+        # ordered by descending weight
+        self.postings = {}
+        total = len(self.names)
+        for term, docs in doc_ids.items():
+            docs = np.array(docs, dtype=np.int32)
+            tf = np.array(term_freqs[term], dtype=np.float32)
+            idf = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            weights = (idf * tf * (self.k1 + 1) / (tf + norms[docs])).astype(np.float32)
+            order = np.argsort(-weights, kind="stable")
+            self.postings[term] = (docs[order], weights[order])
+
+    # The `limit` best matches for `query` as (name, score) pairs, best first.
+    # Ties keep catalog order.
+    def search(self, query, limit=10):
+        import numpy as np
+
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self.postings]
+        if not terms or limit <= 0:
+            return []
+        postings = [self.postings[term] for term in terms]
+        docs = np.concatenate([docs for docs, _ in postings])
+        weights = np.concatenate([weights for _, weights in postings])
+        scores = np.bincount(docs, weights, minlength=len(self.names))
+
+        # A term with at least `limit` postings puts that many documents at or
+        # above its limit-th best weight, so nothing below it can make the cut.
+        floor = max((weights[limit - 1] for _, weights in postings if len(weights) >= limit), default=0)
+        hits = np.flatnonzero(scores >= floor) if floor else np.flatnonzero(scores > 0)
+
+        if len(hits) > limit:
+            hit_scores = scores[hits]
+            cutoff = np.partition(hit_scores, len(hits) - limit)[len(hits) - limit]
+            above = hits[hit_scores > cutoff]
+            ties = hits[hit_scores == cutoff][:limit - len(above)]
+            hits = np.concatenate([above, ties])
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return [(self.names[doc], float(scores[doc])) for doc in hits]
+
+    # HTML excerpt of the first field mentioning any query term, with the
+    # matching words wrapped in <mark>.
+    def snippet(self, name, query, width=160):
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return Markup("")
+        pattern = re.compile(r"(?<![a-z0-9])(%s)(?![a-z0-9])" % "|".join(map(re.escape, terms)), re.IGNORECASE)
+        for text in defect_texts(name, self.defects[name]):
+            first = pattern.search(text)
+            if first:
+                break
+        else:
+            return Markup("")
+
+        start = max(0, first.start() - width // 3)
+        if start > 0:
+            # Don't open the excerpt halfway through a word
+            start = text.rfind(" ", 0, start) + 1
+        end = min(len(text), start + width)
+        excerpt = text[start:end]
+        parts = []
+        position = 0
+        for match in pattern.finditer(excerpt):
+            parts.append(escape(excerpt[position:match.start()]))
+            parts.append(Markup("<mark>%s</mark>") % match.group())
+            position = match.end()
+        parts.append(escape(excerpt[position:]))
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(text) else ""
+        return Markup(prefix) + Markup("").join(parts) + Markup(suffix)
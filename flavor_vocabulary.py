@@ -0,0 +1,149 @@
+# Mapping the off-flavors panelists type ("bandaid", "butter", "cardboardy",
+# "green apple-ish") to the Off-Flavors terms used in the catalog, through a
+# synonym table, light stemming and edit distance.
+import re
+
+word_pattern = re.compile(r"[a-z0-9]+")
+
+# Words that only qualify a flavor ("hint of butter", "solvent-like")
+filler_words = {
+    "a", "an", "and", "aroma", "bit", "faint", "flavor", "flavour", "hint", "ish", "like",
+    "note", "notes", "of", "slight", "slightly", "smell", "some", "strong", "taste", "very",
+}
+
+# Endings stripped from each word, longest first
+suffixes = ("ishness", "iness", "ness", "ish", "ies", "ing", "ed", "y", "s")
+
+vowels = set("aeiou")
+
+def stem(word):
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not (suffix == "s" and word.endswith("ss")):
+            word = word[:-len(suffix)]
+            if suffix == "ies":
+                word += "y"
+                return stem(word)
+            break
+    # "tinny" -> "tinn" -> "tin", "puckering" stays "pucker"
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in vowels and word[-1] not in "ls":
+        word = word[:-1]
+    return word
+
+# The form free text and catalog terms are compared in: lowercase stems with
+# filler words, punctuation and spaces dropped, so "Band-Aid", "band aid" and
+# "bandaid" all become "bandaid"
+def term_key(text):
+    words = [stem(word) for word in word_pattern.findall(text.lower()) if word not in filler_words]
+    return "".join(words)
+
+# How many edits a key of this length may be away from a catalog term
+def edit_limit(key):
+    if len(key) < 4:
+        return 0
+    if len(key) < 8:
+        return 1
+    return 2
+
+# Levenshtein distance between `a` and `b`, or limit + 1 once it is known
+# to be larger than `limit`
+def edit_distance(a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def trigrams(key):
+    padded = f"  {key}  "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# The off-flavor terms of one catalog version. `terms` are the lowercased
+# Off-Flavors entries, `synonyms` maps other wordings to one of them.
+class FlavorVocabulary:
+    def __init__(self, terms, synonyms=None):
+        # key -> the catalog terms with that key
+        self.by_key = {}
+        term_keys = {}
+        for term in terms:
+            key = term_key(term)
+            if key:
+                term_keys[term] = key
+                self.by_key.setdefault(key, []).append(term)
+        for synonym, target in (synonyms or {}).items():
+            found = self.by_key.get(term_key(target))
+            key = term_key(synonym)
+            if found and key:
+                for term in found:
+                    if term not in self.by_key.setdefault(key, []):
+                        self.by_key[key].append(term)
+        # Exact texts answered without computing a key, each with a list of
+        # its own
+        self.by_text = {term: list(self.by_key[key]) for term, key in term_keys.items()}
+        self.keys = list(self.by_key)
+        # Built here rather than on the first typo, which would otherwise
+        # wait for it
+        self.build_trigram_index()
+
+    # Trigram -> ids of the keys containing it, and the length of each key
+    def build_trigram_index(self):
+        import numpy as np
+
+        postings = {}
+        for key_id, key in enumerate(self.keys):
+            for trigram in trigrams(key):
+                postings.setdefault(trigram, []).append(key_id)
+        self.trigram_index = (
+            {trigram: np.array(ids, dtype=np.int32) for trigram, ids in postings.items()},
+            np.array([len(key) for key in self.keys], dtype=np.int32),
+        )
+
+    # The keys closest to `key`, if any is within `limit` edits. A key within k edits
+    # shares all but at most 3k of the query's trigrams, so only keys sharing
+    # enough of them are compared character by character.
+    def nearest_keys(self, key, limit):
+        import numpy as np
+
+        postings, lengths = self.trigram_index
+        query = trigrams(key)
+        needed = len(query) - 3 * limit
+        found = [postings[trigram] for trigram in query if trigram in postings]
+        if not found or needed <= 0:
+            return []
+        counts = np.bincount(np.concatenate(found), minlength=len(self.keys))
+        candidates = np.flatnonzero((counts >= needed) & (np.abs(lengths - len(key)) <= limit))
+
+        best = limit + 1
+        nearest = []
+        for key_id in candidates:
+            candidate = self.keys[key_id]
+            distance = edit_distance(key, candidate, best)
+            if distance < best:
+                best = distance
+                nearest = [candidate]
+            elif distance == best and distance <= limit:
+                nearest.append(candidate)
+        return nearest
+
+    # The catalog terms `text` most likely means: exact or synonym matches,
+    # then stemmed ones, then the closest within a few typos. Empty when
+    # nothing is close.
+    def lookup(self, text):
+        found = self.by_text.get(text)
+        if found is not None:
+            return found
+        key = term_key(text)
+        if not key:
+            return []
+        found = self.by_key.get(key)
+        if found is not None:
+            return found
+        terms = []
+        for nearest in self.nearest_keys(key, edit_limit(key)):
+            terms.extend(term for term in self.by_key[nearest] if term not in terms)
+        return terms
@@ -0,0 +1,58 @@
+# gunicorn settings for the app, picked up automatically from this directory:
+#
+#   gunicorn beer_defects_app:app
+#
+# With BEER_DEFECTS_PRELOAD=1 the app is loaded once in the master, which
+# also builds the search index and imports pandas/openpyxl before forking.
+# Workers then share all of it copy-on-write instead of each building and
+# importing their own.
+#
+# With BEER_DEFECTS_COMPACT_CATALOG=1 and BEER_DEFECTS_CATALOG set, the
+# defects are read from a compact snapshot file that every worker maps
+# read-only, preloaded or not, so the page cache holds the only copy of the
+# defect data. The pages and indexes built from it are still per worker,
+# which makes the saving small; see compact_catalog.py.
+#
+# With BEER_DEFECTS_METRICS_DIR set, every worker writes its metrics to that
+# directory so /metrics can report them all; it is emptied on startup.
+#
+# Every worker runs background jobs in a process pool of its own, so up to
+# workers x BEER_DEFECTS_JOB_WORKERS jobs run at once. When that isn't set,
+# each worker's pool gets an equal share of the CPUs instead.
+import gc
+import os
+import sys
+
+preload_app = os.environ.get("BEER_DEFECTS_PRELOAD") == "1"
+
+
+def on_starting(server):
+    directory = os.environ.get("BEER_DEFECTS_METRICS_DIR")
+    if directory:
+        from metrics import clear_directory
+
+        os.makedirs(directory, exist_ok=True)
+        clear_directory(directory)
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import beer_defects_app
+
+    beer_defects_app.warm_catalog(heavy_imports=True)
+    # Move everything allocated so far out of the collector's reach, so
+    # collections in the workers don't write to (and copy) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if os.environ.get("BEER_DEFECTS_JOB_WORKERS"):
+        return
+    share = max(1, (os.cpu_count() or 1) // server.cfg.workers)
+    os.environ["BEER_DEFECTS_JOB_WORKERS"] = str(share)
+    # A preloaded app read the setting before the fork; its pool is only
+    # started on the first job, so it can still be resized
+    app_module = sys.modules.get("beer_defects_app")
+    if app_module is not None:
+        app_module.job_runner.max_workers = share
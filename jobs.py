@@ -0,0 +1,224 @@
+# Background jobs for work too slow to do inside a request: a bounded
+# process pool per server process runs them (so the whole server runs up to
+# processes x max_workers at once), and their status and results
+# are files in a directory shared by all processes on the box, so any
+# gunicorn worker can answer for a job another one started.
+#
+# A job's id is a hash of what it computes, so identical requests get the
+# same job instead of running it again while it is queued, running or its
+# result is still kept.
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import process_alive
+
+# How long finished jobs and their results are kept
+job_ttl = 3600
+
+def job_id(kind, params):
+    key = json.dumps([kind, params], sort_keys=True).encode("utf-8")
+    return hashlib.sha256(key).hexdigest()[:24]
+
+def write_json(path, data):
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as output:
+        json.dump(data, output)
+    os.replace(output.name, path)
+
+def status_path(directory, job):
+    return os.path.join(directory, f"{job}.json")
+
+def result_path(directory, job):
+    return os.path.join(directory, f"{job}.result")
+
+def read_status(directory, job):
+    try:
+        with open(status_path(directory, job)) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return None
+
+# Write a new job's status unless another process already has; True when
+# this call created it
+def create_status(directory, job, status):
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as output:
+        json.dump(status, output)
+    try:
+        os.link(output.name, status_path(directory, job))
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.unlink(output.name)
+
+# Replace a failed job's status with `status` unless another process already
+# has; True when this call replaced it. Retries take a lock shared by all
+# processes so only one sees the job still failed, and the file is replaced
+# in one step so readers never find it missing.
+def retry_status(directory, job, status):
+    with open(os.path.join(directory, "retry.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        current = read_status(directory, job)
+        if current is None or current["status"] != "failed":
+            return False
+        write_json(status_path(directory, job), status)
+        return True
+
+def update_status(directory, job, **changes):
+    status = read_status(directory, job) or {}
+    status.update(changes)
+    write_json(status_path(directory, job), status)
+    return status
+
+# Runs in a pool process. `function(*args)` returns (data, mimetype,
+# filename) for the result download, where data is bytes or an iterable of
+# chunks of bytes, written out as they come.
+def run_job(directory, job, function, args):
+    started = time.time()
+    update_status(directory, job, status="running", started=started, runner=os.getpid())
+    output = None
+    try:
+        data, mimetype, filename = function(*args)
+        with tempfile.NamedTemporaryFile("wb", dir=directory, suffix=".tmp", delete=False) as output:
+            for chunk in [data] if isinstance(data, bytes) else data:
+                output.write(chunk)
+            size = output.tell()
+        os.replace(output.name, result_path(directory, job))
+    except Exception as error:
+        # Chunks can fail partway through; don't leave the partial result
+        if output is not None:
+            try:
+                os.unlink(output.name)
+            except OSError:
+                pass
+        update_status(directory, job, status="failed", finished=time.time(), error=f"{type(error).__name__}: {error}")
+        raise
+    finished = time.time()
+    update_status(
+        directory, job, status="done", finished=finished, mimetype=mimetype, filename=filename, size=size
+    )
+    return finished - started
+
+class JobRunner:
+    def __init__(self, directory, max_workers=2, metrics=None):
+        self.directory = directory
+        self.max_workers = max_workers
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.pool = None
+        self.pid = None
+        # Jobs this process submitted that haven't finished
+        self.pending = 0
+
+    # The pool of this process; a forked worker starts its own rather than
+    # using its parent's
+    def get_pool(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            self.pending = 0
+            os.makedirs(self.directory, exist_ok=True)
+        return self.pool
+
+    def report_load(self):
+        if self.metrics is None:
+            return
+        busy = min(self.pending, self.max_workers)
+        self.metrics.set_gauge("beer_defects_jobs_queued", self.pending - busy)
+        self.metrics.set_gauge("beer_defects_job_workers_busy", busy)
+        self.metrics.set_gauge("beer_defects_job_workers", self.max_workers)
+
+    # The status of the job computing `function(*args)`, starting it unless
+    # an identical job is queued, running or finished recently. `params`
+    # identifies the work (with `kind`); `args` are what the function gets.
+    def submit(self, kind, params, function, args):
+        job = job_id(kind, params)
+        with self.lock:
+            pool = self.get_pool()
+            self.remove_expired()
+            status = self.status(job)
+            if status is not None and status["status"] != "failed":
+                return status
+            failed = status is not None
+            status = {"id": job, "kind": kind, "status": "queued", "submitted": time.time(), "owner": os.getpid()}
+            if failed:
+                created = retry_status(self.directory, job, status)
+            else:
+                created = create_status(self.directory, job, status)
+            if not created:
+                # Another process submitted or retried it first
+                return self.status(job)
+            try:
+                future = pool.submit(run_job, self.directory, job, function, args)
+            except BrokenProcessPool:
+                # A pool process died; start a new pool
+                self.pid = None
+                future = self.get_pool().submit(run_job, self.directory, job, function, args)
+            self.pending += 1
+            self.report_load()
+        future.add_done_callback(lambda future: self.finished(job, kind, future))
+        return status
+
+    def finished(self, job, kind, future):
+        with self.lock:
+            self.pending -= 1
+            self.report_load()
+        error = future.exception()
+        if error is not None:
+            # run_job records its own failures; this covers a pool process
+            # that died before it could
+            status = read_status(self.directory, job)
+            if status is None or status["status"] not in ("done", "failed"):
+                update_status(self.directory, job, status="failed", finished=time.time(), error=f"{type(error).__name__}: {error}")
+        if self.metrics is not None:
+            self.metrics.increment("beer_defects_jobs_total", (("kind", kind), ("status", "failed" if error else "done")))
+            if error is None:
+                self.metrics.observe(("beer_defects_job_duration_seconds", (("kind", kind),)), future.result())
+
+    # A job's status, or None for an unknown or expired job. A queued or
+    # running job whose process is gone is reported as failed.
+    def status(self, job):
+        status = read_status(self.directory, job)
+        if status is None:
+            return None
+        if status["status"] in ("queued", "running"):
+            owner = status.get("runner" if status["status"] == "running" else "owner")
+            if owner and not process_alive(owner):
+                status = update_status(
+                    self.directory, job, status="failed", finished=time.time(), error="the job's process exited"
+                )
+        return status
+
+    def result(self, job):
+        return result_path(self.directory, job)
+
+    # Statuses of all kept jobs, newest first
+    def list(self):
+        statuses = []
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            if name.endswith(".json"):
+                status = self.status(name[:-len(".json")])
+                if status is not None:
+                    statuses.append(status)
+        return sorted(statuses, key=lambda status: status.get("submitted", 0), reverse=True)
+
+    def remove_expired(self):
+        cutoff = time.time() - job_ttl
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            job = name[:-len(".json")]
+            status = read_status(self.directory, job)
+            if status and status["status"] in ("done", "failed") and status.get("finished", 0) < cutoff:
+                for path in (result_path(self.directory, job), status_path(self.directory, job)):
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
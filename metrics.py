@@ -0,0 +1,237 @@
+# Request and hot-path timing for /metrics, in the Prometheus text format.
+#
+# Every process keeps its own histograms in memory. When a metrics
+# directory is configured, each process also writes them to a file of its
+# own there about once a second, and /metrics adds up the files of all
+# processes, so the numbers cover every gunicorn worker rather than only the
+# one that answered the scrape.
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# Upper bounds, in seconds, of the latency histogram buckets
+latency_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help) of everything /metrics reports
+metric_help = {
+    "beer_defects_requests_total": ("counter", "Requests handled, by route, method and status."),
+    "beer_defects_request_duration_seconds": ("histogram", "Request latency by route and method."),
+    "beer_defects_span_duration_seconds": ("histogram", "Time spent in named sections of request handling."),
+    "beer_defects_jobs_total": ("counter", "Background jobs finished, by kind and outcome."),
+    "beer_defects_jobs_queued": ("gauge", "Background jobs waiting for a job worker."),
+    "beer_defects_job_workers_busy": ("gauge", "Job workers running a job."),
+    "beer_defects_job_workers": ("gauge", "Job workers available."),
+    "beer_defects_job_duration_seconds": ("histogram", "Background job run time by kind."),
+    "beer_defects_query_cache_hits_total": ("counter", "Query results answered from the cache, by kind."),
+    "beer_defects_query_cache_misses_total": ("counter", "Query results computed for the cache, by kind."),
+    "beer_defects_query_cache_evictions_total": ("counter", "Cached query results dropped to make room, by store."),
+}
+
+class Metrics:
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.enabled = True
+        # Label tuples of each (route, method, status) and span name seen,
+        # built once rather than on every observation
+        self.request_keys = {}
+        self.span_keys = {}
+        self.start()
+        if directory is not None:
+            atexit.register(self.flush)
+        os.register_at_fork(after_in_child=self.start)
+
+    # Empty metrics and, with a metrics directory, a thread that rewrites
+    # this process's file while there is something new. A forked worker
+    # starts over from here instead of keeping its parent's copy, with a
+    # lock of its own in case the parent held it while forking.
+    def start(self):
+        self.lock = threading.Lock()
+        # (name, labels) -> count for counters, current value for gauges, or
+        # [bucket counts..., +Inf count, sum] for histograms. Labels are a
+        # tuple of (name, value). Gauges of all processes are added up.
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.dirty = False
+        if self.directory is not None:
+            threading.Thread(target=self.flush_loop, daemon=True).start()
+
+    # Add one observation to a histogram; the caller holds the lock
+    def add(self, key, seconds):
+        values = self.histograms.get(key)
+        if values is None:
+            values = self.histograms[key] = [0] * (len(latency_buckets) + 1) + [0.0]
+        values[bisect_left(latency_buckets, seconds)] += 1
+        values[-1] += seconds
+        self.dirty = True
+
+    def increment(self, name, labels=()):
+        if not self.enabled:
+            return
+        key = (name, tuple(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+            self.dirty = True
+
+    def set_gauge(self, name, value, labels=()):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, tuple(labels))] = value
+            self.dirty = True
+
+    def observe(self, key, seconds):
+        with self.lock:
+            self.add(key, seconds)
+
+    def observe_request(self, route, method, status, seconds):
+        if not self.enabled:
+            return
+        keys = self.request_keys.get((route, method, status))
+        if keys is None:
+            keys = self.request_keys[(route, method, status)] = (
+                ("beer_defects_requests_total", (("method", method), ("route", route), ("status", str(status)))),
+                ("beer_defects_request_duration_seconds", (("method", method), ("route", route))),
+            )
+        counter, histogram = keys
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + 1
+            self.add(histogram, seconds)
+
+    # Time the body of a `with` block as the span `name`
+    def span(self, name):
+        if not self.enabled:
+            return no_span
+        key = self.span_keys.get(name)
+        if key is None:
+            key = self.span_keys[name] = ("beer_defects_span_duration_seconds", (("span", name),))
+        return Span(self, key)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                "gauges": [[name, list(labels), value] for (name, labels), value in self.gauges.items()],
+                "histograms": [[name, list(labels), list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+    def flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self.dirty:
+                self.flush()
+
+    def flush(self):
+        if self.directory is None:
+            return
+        self.dirty = False
+        data = self.snapshot()
+        # Metrics never fail a request; a missing or full directory just
+        # leaves this process out until the next flush works
+        try:
+            with tempfile.NamedTemporaryFile("w", dir=self.directory, suffix=".tmp", delete=False) as output:
+                json.dump(data, output)
+            os.replace(output.name, os.path.join(self.directory, f"metrics-{os.getpid()}.json"))
+        except OSError:
+            self.dirty = True
+
+    # Counters and histograms summed over every process writing to the
+    # metrics directory, or just this process without one. Files of
+    # processes that have exited still count towards the counters and
+    # histograms, which only ever go up, but not the gauges: those describe
+    # the live processes.
+    def collect(self):
+        if self.directory is None:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush()
+            snapshots = []
+            for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+                try:
+                    with open(path) as source:
+                        snapshot = json.load(source)
+                except (OSError, ValueError):
+                    continue
+                pid = os.path.basename(path)[len("metrics-"):-len(".json")]
+                if pid.isdigit() and not process_alive(int(pid)):
+                    snapshot["gauges"] = []
+                snapshots.append(snapshot)
+
+        counters = {}
+        histograms = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot["counters"] + snapshot.get("gauges", []):
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.get(key)
+                histograms[key] = values if total is None else [a + b for a, b in zip(total, values)]
+        return counters, histograms
+
+    def render(self):
+        counters, histograms = self.collect()
+        lines = []
+        for name, (metric_type, help_text) in metric_help.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type in ("counter", "gauge"):
+                for (key_name, labels), value in sorted(counters.items()):
+                    if key_name == name:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+                continue
+            for (key_name, labels), values in sorted(histograms.items()):
+                if key_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(latency_buckets + ("+Inf",), values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {values[-1]}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+class Span:
+    __slots__ = ("metrics", "key", "start")
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.key, time.perf_counter() - self.start)
+
+no_span = nullcontext()
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# Remove the files left by earlier server runs. Called by gunicorn before it
+# starts workers.
+def clear_directory(directory):
+    for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+        os.unlink(path)
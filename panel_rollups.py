@@ -0,0 +1,139 @@
+# Sensory panel tallies: tasting records are matched to defects as they
+# arrive and only per day/beer/line counts are kept, in SQLite, so trend
+# views read a small rollup table instead of every tasting ever recorded.
+import sqlite3
+from datetime import datetime, timezone
+
+schema = """
+CREATE TABLE IF NOT EXISTS panel_tastings (
+    day TEXT NOT NULL,
+    beer TEXT NOT NULL,
+    line TEXT NOT NULL,
+    tastings INTEGER NOT NULL,
+    flagged INTEGER NOT NULL,
+    PRIMARY KEY (day, beer, line)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS panel_defects (
+    day TEXT NOT NULL,
+    beer TEXT NOT NULL,
+    line TEXT NOT NULL,
+    defect TEXT NOT NULL,
+    tastings INTEGER NOT NULL,
+    PRIMARY KEY (day, beer, line, defect)
+) WITHOUT ROWID;
+"""
+
+# Dimensions the rollups can be grouped by
+rollup_dimensions = ("day", "beer", "line")
+
+# The day a tasting belongs to: the date part of its "date" (an ISO date or
+# datetime), or today in UTC
+def tasting_day(record):
+    value = str(record.get("date") or "").strip()
+    if not value:
+        return datetime.now(timezone.utc).date().isoformat()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).date().isoformat()
+    except ValueError:
+        raise ValueError(f"invalid tasting date: {value!r}")
+
+class PanelStore:
+    def __init__(self, path):
+        self.path = path
+        connection = self.connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(schema)
+        finally:
+            connection.close()
+
+    # Connections aren't shared between requests or forked workers; WAL lets
+    # them read while another one writes
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # Add tasting records. `records` are (record, stage, off_flavor_list)
+    # triples with the report already parsed; `match_batch` maps a list of
+    # (stage, off_flavor_list) to the matching defect names for each. A
+    # tasting without off-flavors counts as clean. Each record adds one to a
+    # tastings row and to one row per matched defect, whatever the history,
+    # and the whole call is one transaction.
+    def ingest(self, records, match_batch):
+        tastings = {}
+        defects = {}
+        reported = []
+        keys = []
+        for record, stage, off_flavor_list in records:
+            key = (tasting_day(record), str(record.get("beer") or ""), str(record.get("line") or ""))
+            tastings.setdefault(key, [0, 0])[0] += 1
+            if off_flavor_list:
+                reported.append((stage, off_flavor_list))
+                keys.append(key)
+
+        flagged = 0
+        for key, names in zip(keys, match_batch(reported)):
+            if names:
+                flagged += 1
+                tastings[key][1] += 1
+            for name in names:
+                defect_key = key + (name,)
+                defects[defect_key] = defects.get(defect_key, 0) + 1
+
+        connection = self.connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO panel_tastings VALUES (?, ?, ?, ?, ?) ON CONFLICT (day, beer, line) DO UPDATE SET "
+                    "tastings = tastings + excluded.tastings, flagged = flagged + excluded.flagged",
+                    [key + tuple(counts) for key, counts in tastings.items()],
+                )
+                connection.executemany(
+                    "INSERT INTO panel_defects VALUES (?, ?, ?, ?, ?) ON CONFLICT (day, beer, line, defect) DO UPDATE SET "
+                    "tastings = tastings + excluded.tastings",
+                    [key + (count,) for key, count in defects.items()],
+                )
+        finally:
+            connection.close()
+        return {"ingested": sum(counts[0] for counts in tastings.values()), "flagged": flagged}
+
+    # Defect counts grouped by `dimensions` (any of "day", "beer", "line")
+    # since `since` (an ISO date, or None for everything), most reported
+    # first. Each row also has how many tastings its group had.
+    def rollup(self, dimensions=("day",), since=None, defect=None):
+        for dimension in dimensions:
+            if dimension not in rollup_dimensions:
+                raise ValueError(f"unknown rollup dimension: {dimension!r}")
+        columns = "".join(f"{dimension}, " for dimension in dimensions)
+        conditions, parameters = [], []
+        if since:
+            conditions.append("day >= ?")
+            parameters.append(since)
+        if defect:
+            conditions.append("defect = ?")
+            parameters.append(defect)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        tasting_where = "WHERE day >= ?" if since else ""
+        group_by = f"GROUP BY {', '.join(dimensions)}" if dimensions else ""
+
+        connection = self.connect()
+        try:
+            groups = {
+                row[:-1]: row[-1]
+                for row in connection.execute(
+                    f"SELECT {columns}SUM(tastings) FROM panel_tastings {tasting_where} {group_by}",
+                    [since] if since else [],
+                )
+            }
+            rows = connection.execute(
+                f"SELECT {columns}defect, SUM(tastings) AS reported FROM panel_defects {where} "
+                f"GROUP BY {columns}defect ORDER BY {columns}reported DESC, defect",
+                parameters,
+            ).fetchall()
+        finally:
+            connection.close()
+        return [
+            dict(zip(dimensions, row[:-2]), defect=row[-2], reported=row[-1], tastings=groups.get(row[:-2], 0))
+            for row in rows
+        ]
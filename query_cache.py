@@ -0,0 +1,163 @@
+# Results of repeated troubleshooting and search queries. Each process keeps
+# the most recently used results in memory; with a shared SQLite file, a
+# result computed by one gunicorn worker also answers the same query in the
+# others. Entries belong to one catalog version and are dropped when a new
+# version is seen, and expire after a while either way.
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+schema = """
+CREATE TABLE IF NOT EXISTS query_cache (
+    key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires REAL NOT NULL,
+    used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS query_cache_used ON query_cache (used);
+"""
+
+# Key of one troubleshooting query: the same off-flavors in any order or
+# repeated give the same results. `extra` is anything else the results
+# depend on, such as a limit.
+def troubleshoot_key(kind, stage, off_flavor_list, *extra):
+    return json.dumps([kind, stage, sorted(set(off_flavor_list)), *extra])
+
+class QueryCache:
+    # At most `max_entries` results are kept, in memory and in the shared
+    # file each, for up to `ttl` seconds. `max_entries` of 0 turns the cache
+    # off. Values must survive a round trip through JSON when `path` is set.
+    def __init__(self, max_entries=1024, ttl=300.0, path=None, metrics=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        # key -> (value, expires), least recently used first
+        self.entries = OrderedDict()
+        self.version = None
+        self.local = threading.local()
+        self.counts = {"hits": 0, "misses": 0, "evictions": 0}
+
+    # This thread's connection to the shared file; a forked worker opens its
+    # own rather than using its parent's
+    def connect(self):
+        local = self.local
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(schema)
+            local.connection = connection
+            local.seen_version = None
+            local.pid = os.getpid()
+        return local.connection
+
+    def count(self, result, labels, times=1):
+        with self.lock:
+            self.counts[result] += times
+        if self.metrics is not None:
+            for _ in range(times):
+                self.metrics.increment(f"beer_defects_query_cache_{result}_total", labels)
+
+    # The cached result of `key` under catalog `version`, or `compute()`'s,
+    # which is then kept. `kind` labels the counters.
+    def get(self, kind, version, key, compute):
+        if self.max_entries <= 0:
+            return compute()
+        now = time.time()
+        found = self.get_local(version, key, now)
+        if found is None and self.path is not None:
+            try:
+                found = self.get_shared(version, key, now)
+            except sqlite3.Error:
+                # A busy or broken shared file only costs the hit
+                found = None
+            if found is not None:
+                self.put_local(key, found[0], found[1])
+        if found is not None:
+            self.count("hits", (("kind", kind),))
+            return found[0]
+
+        self.count("misses", (("kind", kind),))
+        value = compute()
+        expires = now + self.ttl
+        self.put_local(key, value, expires)
+        if self.path is not None:
+            try:
+                self.put_shared(version, key, value, expires, now)
+            except sqlite3.Error:
+                pass
+        return value
+
+    def get_local(self, version, key, now):
+        with self.lock:
+            if version != self.version:
+                # The catalog changed; nothing kept is right any more
+                self.entries.clear()
+                self.version = version
+                return None
+            found = self.entries.get(key)
+            if found is None:
+                return None
+            if found[1] <= now:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return found
+
+    def put_local(self, key, value, expires):
+        evicted = 0
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self.count("evictions", (("store", "local"),), evicted)
+
+    def get_shared(self, version, key, now):
+        connection = self.connect()
+        self.check_shared_version(connection, version)
+        row = connection.execute(
+            "SELECT value, expires FROM query_cache WHERE key = ? AND version = ? AND expires > ?",
+            (key, version, now),
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE query_cache SET used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1]
+
+    def put_shared(self, version, key, value, expires, now):
+        connection = self.connect()
+        self.check_shared_version(connection, version)
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?)",
+                (key, version, json.dumps(value), expires, now),
+            )
+            excess = connection.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                # Least recently used first, expired or not
+                connection.execute(
+                    "DELETE FROM query_cache WHERE key IN (SELECT key FROM query_cache ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+        if excess > 0:
+            self.count("evictions", (("store", "shared"),), excess)
+
+    # Drop other versions' entries the first time this thread uses a version
+    def check_shared_version(self, connection, version):
+        if self.local.seen_version != version:
+            connection.execute("DELETE FROM query_cache WHERE version != ?", (version,))
+            self.local.seen_version = version
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, entries=len(self.entries), max_entries=self.max_entries)
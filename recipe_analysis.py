@@ -0,0 +1,183 @@
+# Recipe analysis: threshold rules compiled into per-parameter interval
+# indexes, and the same rules applied to whole batch logs chunk by chunk
+import math
+
+# pandas is only imported by the batch log functions that need it, so the
+# app doesn't load it at startup.
+
+# Rows read from an upload at a time
+chunk_rows = 50_000
+
+# Optional batch identifier column of a batch log
+batch_id_column = "batch"
+
+# The closed float interval of values a rule fires on. Rules bound their
+# parameter with "above" (>), "at_least" (>=), "below" (<) and/or "at_most"
+# (<=); strict bounds are moved to the next representable float.
+def rule_interval(rule):
+    low, high = -math.inf, math.inf
+    if "above" in rule:
+        low = math.nextafter(float(rule["above"]), math.inf)
+    if "at_least" in rule:
+        low = max(low, float(rule["at_least"]))
+    if "below" in rule:
+        high = math.nextafter(float(rule["below"]), -math.inf)
+    if "at_most" in rule:
+        high = min(high, float(rule["at_most"]))
+    if low == -math.inf and high == math.inf:
+        raise ValueError(f"rule for {rule.get('parameter')!r} has no bounds")
+    # An empty range would never fire and can't be placed in an IntervalTree
+    if low > high:
+        raise ValueError(f"rule {rule!r} matches no values")
+    return low, high
+
+# A recipe parameter entered as text. float() also reads "nan" and "inf",
+# which would slip past every rule or fire all of one side, so only finite
+# numbers are accepted.
+def parse_recipe_value(text):
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"not a finite number: {text!r}")
+    return value
+
+# Centered interval tree over (low, high, item) closed intervals. A lookup
+# walks one root-to-leaf path and only touches intervals that contain the
+# value, so it costs O(log n + matches).
+class IntervalTree:
+    def __init__(self, intervals):
+        self.root = self.build(list(intervals))
+
+    @classmethod
+    def build(cls, intervals):
+        if not intervals:
+            return None
+        endpoints = sorted(point for low, high, _ in intervals for point in (low, high) if math.isfinite(point))
+        center = endpoints[len(endpoints) // 2]
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        by_low = sorted(here, key=lambda interval: interval[0])
+        by_high = sorted(here, key=lambda interval: interval[1], reverse=True)
+        return center, by_low, by_high, cls.build(left), cls.build(right)
+
+    def stab(self, value):
+        found = []
+        node = self.root
+        while node is not None:
+            center, by_low, by_high, left, right = node
+            if value < center:
+                for low, _, item in by_low:
+                    if low > value:
+                        break
+                    found.append(item)
+                node = left
+            elif value > center:
+                for _, high, item in by_high:
+                    if high < value:
+                        break
+                    found.append(item)
+                node = right
+            else:
+                found.extend(item for _, _, item in by_low)
+                break
+        return found
+
+# A list of recipe rules compiled into one interval tree per parameter
+class RuleIndex:
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.intervals = [rule_interval(rule) for rule in self.rules]
+        intervals = {}
+        for position, (rule, (low, high)) in enumerate(zip(self.rules, self.intervals)):
+            intervals.setdefault(rule["parameter"], []).append((low, high, position))
+        self.trees = {parameter: IntervalTree(found) for parameter, found in intervals.items()}
+        self.parameters = list(self.trees)
+
+    # The rules fired by a {parameter: value} recipe, in rule order. Missing
+    # or NaN values fire nothing.
+    def evaluate(self, values):
+        fired = []
+        for parameter, value in values.items():
+            tree = self.trees.get(parameter)
+            if tree is not None and value is not None and not math.isnan(value):
+                fired.extend(tree.stab(float(value)))
+        return [self.rules[position] for position in sorted(fired)]
+
+def rule_issue(rule):
+    return rule.get("issue", rule["defect"])
+
+def empty_issues():
+    import pandas as pd
+
+    return pd.DataFrame({"batch": pd.Series(dtype=str), "issue": pd.Series(dtype=str)})
+
+# The per-batch issues table for one chunk of a batch log: a "batch" and an
+# "issue" column, one row per problem found, indexed like `frame`.
+# `first_row` numbers batches that have no identifier column.
+def analyze_batch_frame(frame, rule_index, first_row=0):
+    import pandas as pd
+
+    columns = [parameter for parameter in rule_index.parameters if parameter in frame.columns]
+    if not columns:
+        raise ValueError(f"expected at least one of the columns: {', '.join(rule_index.parameters)}")
+
+    if batch_id_column in frame.columns:
+        batch = frame[batch_id_column].astype(str)
+    else:
+        batch = pd.Series(range(first_row + 1, first_row + len(frame) + 1), index=frame.index).astype(str)
+
+    # Unparseable and infinite values count as missing and never flag an issue
+    values = {
+        column: pd.to_numeric(frame[column], errors="coerce").replace([math.inf, -math.inf], math.nan)
+        for column in columns
+    }
+    issues = []
+    for rule, (low, high) in zip(rule_index.rules, rule_index.intervals):
+        column = values.get(rule["parameter"])
+        if column is None:
+            continue
+        mask = (column >= low) & (column <= high)
+        if mask.any():
+            issues.append(pd.DataFrame({"batch": batch[mask], "issue": rule_issue(rule)}))
+    if not issues:
+        return empty_issues()
+    return pd.concat(issues).sort_index(kind="stable")
+
+# Chunks of an uploaded CSV or Parquet batch log as DataFrames
+def read_batch_log(stream, file_format):
+    import pandas as pd
+
+    if file_format == "csv":
+        yield from pd.read_csv(stream, chunksize=chunk_rows)
+    elif file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        for record_batch in pq.ParquetFile(stream).iter_batches(batch_size=chunk_rows):
+            yield record_batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported batch log format: {file_format}")
+
+# Analyze a whole batch log. Returns the number of batches read, how many of
+# them had any issue, the count of batches with each issue, and the issues
+# table.
+def analyze_batch_log(stream, file_format, rule_index):
+    import pandas as pd
+
+    rows = flagged = 0
+    counts = {}
+    tables = []
+    for frame in read_batch_log(stream, file_format):
+        issues = analyze_batch_frame(frame, rule_index, first_row=rows)
+        rows += len(frame)
+        flagged += issues.index.nunique()
+        for issue, count in issues["issue"].value_counts(sort=False).items():
+            counts[issue] = counts.get(issue, 0) + int(count)
+        tables.append(issues)
+    if not tables:
+        return rows, flagged, counts, empty_issues()
+    return rows, flagged, counts, pd.concat(tables, ignore_index=True)
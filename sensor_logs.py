@@ -0,0 +1,262 @@
+# Fermentation sensor logs: per-minute temperature and gravity readings from
+# each vessel, read in chunks and checked with rolling windows for conditions
+# that lead to catalog defects. Findings come out chunk by chunk, so a log of
+# any size is analyzed in bounded memory.
+#
+#   python sensor_logs.py fermenters-2024-05.csv > findings.ndjson
+import argparse
+import itertools
+import json
+import sys
+
+# pandas is only imported by the functions that need it, so the app doesn't
+# load it at startup.
+
+# Rows read from a log at a time
+chunk_rows = 200_000
+
+# Log columns. "event" is optional; a "packaged" event marks when the vessel
+# was packaged.
+time_column = "time"
+vessel_column = "vessel"
+temperature_column = "temperature"
+gravity_column = "gravity"
+event_column = "event"
+log_columns = {time_column, vessel_column, temperature_column, gravity_column, event_column}
+
+# Temperatures are judged by their 30-minute mean, so single noisy readings
+# don't count
+temperature_window = "30min"
+
+# Temperature spike: above the same 70°F limit the ferment_temp recipe rule
+# uses
+spike_temperature = 70.0
+
+# Cold crash: dropping below 40°F. A diacetyl rest is a full day at 60°F or
+# warmer, and is expected within 5 days of the crash.
+crash_temperature = 40.0
+rest_window = "24h"
+rest_temperature = 60.0
+rest_lookback = "5D"
+
+# Terminal gravity: moved less than 0.002 over the 48 hours before packaging
+terminal_window = "48h"
+terminal_tolerance = 0.002
+
+# Windows only count once readings cover this much of them
+window_coverage = 0.9
+
+# (issue, catalog defect) of each check
+sensor_issues = {
+    "spike": ("Temperature spike during fermentation", "Alcoholic"),
+    "no_rest": ("Cold crash without a diacetyl rest", "Diacetyl"),
+    "early_packaging": ("Packaged before terminal gravity", "Acetaldehyde"),
+}
+
+# Chunks of a CSV or JSON lines sensor log as DataFrames
+def read_sensor_log(stream, file_format):
+    import pandas as pd
+
+    if file_format == "csv":
+        # Only the columns the checks use are parsed
+        yield from pd.read_csv(
+            stream, chunksize=chunk_rows, usecols=lambda column: column in log_columns,
+            dtype={vessel_column: str, event_column: str},
+        )
+    elif file_format == "jsonl":
+        yield from pd.read_json(stream, lines=True, chunksize=chunk_rows, dtype={vessel_column: str, event_column: str})
+    else:
+        raise ValueError(f"Unsupported sensor log format: {file_format}")
+
+def check_columns(frame):
+    missing = [column for column in (time_column, vessel_column, temperature_column) if column not in frame.columns]
+    if missing:
+        raise ValueError(f"sensor log is missing the columns: {', '.join(missing)}")
+
+# Chunks of a sensor log, with the first one read and checked right away so a
+# log that can't be analyzed fails before anything is analyzed
+def open_sensor_log(stream, file_format):
+    frames = read_sensor_log(stream, file_format)
+    first = next(frames, None)
+    if first is None:
+        return iter(())
+    check_columns(first)
+    return itertools.chain([first], frames)
+
+# One chunk with parsed, typed columns and unusable rows dropped
+def prepare_chunk(frame):
+    import pandas as pd
+
+    check_columns(frame)
+    prepared = pd.DataFrame({
+        "vessel": frame[vessel_column].astype(str),
+        # Nanoseconds whatever resolution pandas infers, to compare with
+        # Timedelta values
+        "time": pd.to_datetime(frame[time_column], errors="coerce", utc=True, format="ISO8601").dt.as_unit("ns"),
+        "temperature": pd.to_numeric(frame[temperature_column], errors="coerce"),
+        "gravity": pd.to_numeric(frame[gravity_column], errors="coerce") if gravity_column in frame.columns else float("nan"),
+        "packaged": False,
+    })
+    if event_column in frame.columns:
+        # Nearly every reading has no event, so only those with one are compared
+        events = frame[event_column]
+        events = events[events.notna()]
+        prepared.loc[events.index, "packaged"] = events.astype(str).str.strip().str.lower().eq("packaged")
+    return prepared[prepared["time"].notna()]
+
+# Finds each vessel's issues in a log fed to it chunk by chunk. The last
+# `carry` of every vessel's readings is kept between chunks so rolling windows
+# and crossings at a chunk boundary see the readings before it.
+class SensorLogAnalyzer:
+    def __init__(self):
+        import pandas as pd
+
+        self.carry_span = max(pd.Timedelta(window) for window in (temperature_window, rest_window, terminal_window))
+        self.carry = None
+        # vessel -> rows, first and last reading time, issue counts and the
+        # last time a diacetyl rest was complete
+        self.vessels = {}
+
+    # Findings in the next chunk, grouped by vessel and in time order
+    def feed(self, frame):
+        import pandas as pd
+
+        frame = prepare_chunk(frame)
+        frame["new"] = True
+        if self.carry is not None:
+            frame = pd.concat([self.carry, frame], ignore_index=True)
+
+        findings = []
+        for vessel, rows in frame.groupby("vessel", sort=True):
+            findings.extend(self.check_vessel(vessel, rows.sort_values("time", kind="stable")))
+
+        last_seen = frame.groupby("vessel")["time"].transform("max")
+        self.carry = frame[frame["time"] > last_seen - self.carry_span].assign(new=False)
+        return findings
+
+    def check_vessel(self, vessel, rows):
+        import numpy as np
+        import pandas as pd
+
+        rows = rows.set_index("time")
+        new = rows["new"].to_numpy()
+        times = rows.index
+        state = self.vessels.setdefault(
+            vessel, {"rows": 0, "first": None, "last": None, "issues": {}, "last_rest": None}
+        )
+        if new.any():
+            state["rows"] += int(new.sum())
+            if state["first"] is None:
+                state["first"] = times[new][0]
+            state["last"] = times[new][-1]
+
+        temperature = rows["temperature"]
+        mean = temperature.rolling(temperature_window).mean().to_numpy()
+        spiking = mean > spike_temperature
+        crashed = mean < crash_temperature
+
+        # Time since the first reading still inside each rolling window
+        elapsed = pd.Series(times.asi8, index=times)
+        rest_span = (elapsed - elapsed.rolling(rest_window).min()).to_numpy()
+        rested = (
+            (temperature.rolling(rest_window).min().to_numpy() >= rest_temperature)
+            & (rest_span >= pd.Timedelta(rest_window).value * window_coverage)
+        )
+        # Last complete rest at or before each reading, carried across chunks
+        rest_times = np.where(rested, times.asi8, np.iinfo(np.int64).min)
+        if state["last_rest"] is not None:
+            rest_times[0] = max(rest_times[0], state["last_rest"].value)
+        last_rest = np.maximum.accumulate(rest_times)
+
+        findings = []
+        for position in np.flatnonzero(new & rising(spiking)):
+            findings.append(self.finding(
+                state, vessel, times[position], "spike",
+                f"30-minute mean reached {mean[position]:.1f}°F",
+            ))
+        for position in np.flatnonzero(new & rising(crashed)):
+            rest = last_rest[position]
+            if rest == np.iinfo(np.int64).min or times.asi8[position] - rest > pd.Timedelta(rest_lookback).value:
+                findings.append(self.finding(
+                    state, vessel, times[position], "no_rest",
+                    f"no day at {rest_temperature:.0f}°F or warmer in the {pd.Timedelta(rest_lookback).days} days before the crash",
+                ))
+        packaged = rows["packaged"].to_numpy() & new
+        if packaged.any():
+            gravity = rows["gravity"]
+            terminal_span = (elapsed - elapsed.rolling(terminal_window).min()).to_numpy()
+            movement = (gravity.rolling(terminal_window).max() - gravity.rolling(terminal_window).min()).to_numpy()
+            for position in np.flatnonzero(packaged):
+                covered = terminal_span[position] >= pd.Timedelta(terminal_window).value * window_coverage
+                if not covered or not movement[position] < terminal_tolerance:
+                    detail = (
+                        f"gravity moved {movement[position]:.4f} in the last {terminal_window}" if covered
+                        else f"less than {terminal_window} of gravity readings before packaging"
+                    )
+                    findings.append(self.finding(state, vessel, times[position], "early_packaging", detail))
+
+        if rested[new].any():
+            state["last_rest"] = times[new][rested[new]][-1]
+        return findings
+
+    def finding(self, state, vessel, time, check, detail):
+        issue, defect = sensor_issues[check]
+        state["issues"][issue] = state["issues"].get(issue, 0) + 1
+        return {"vessel": vessel, "time": time.isoformat(), "issue": issue, "defect": defect, "detail": detail}
+
+    # One summary per vessel once the whole log has been fed
+    def summaries(self):
+        return [
+            {
+                "vessel": vessel,
+                "rows": state["rows"],
+                "first": state["first"].isoformat() if state["first"] is not None else None,
+                "last": state["last"].isoformat() if state["last"] is not None else None,
+                "issues": state["issues"],
+            }
+            for vessel, state in sorted(self.vessels.items())
+        ]
+
+# Where a boolean array turns true. The first reading has nothing before it
+# to compare with, so a log that starts cold doesn't count as a crash.
+def rising(flags):
+    import numpy as np
+
+    previous = np.concatenate([flags[:1], flags[:-1]])
+    return flags & ~previous
+
+# Findings as they are found, then {"summary": ...} for each vessel, from a
+# log's chunks
+def analyze_sensor_frames(frames):
+    analyzer = SensorLogAnalyzer()
+    for frame in frames:
+        yield from analyzer.feed(frame)
+    for summary in analyzer.summaries():
+        yield {"summary": summary}
+
+def analyze_sensor_log(stream, file_format):
+    return analyze_sensor_frames(read_sensor_log(stream, file_format))
+
+def sensor_log_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+def main():
+    parser = argparse.ArgumentParser(description="Check fermentation sensor logs for conditions behind beer defects.")
+    parser.add_argument("log", help="CSV or JSON lines log, or - for CSV on stdin")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="log format (default: from the file name)")
+    args = parser.parse_args()
+
+    file_format = args.format or sensor_log_format(args.log)
+    source = sys.stdin.buffer if args.log == "-" else open(args.log, "rb")
+    try:
+        for line in analyze_sensor_log(source, file_format):
+            sys.stdout.write(json.dumps(line) + "\n")
+            sys.stdout.flush()
+    except ValueError as error:
+        sys.exit(f"error: {error}")
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+
+if __name__ == "__main__":
+    main()
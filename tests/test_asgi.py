@@ -0,0 +1,33 @@
+import beer_defects_app
+import beer_defects_asgi
+
+
+def scope(path, method="GET"):
+    return {"type": "http", "path": path, "method": method, "headers": []}
+
+
+def test_cached_routes_leave_the_loop_with_a_shared_cache(monkeypatch):
+    assert beer_defects_asgi.runs_inline(scope("/search"))
+    monkeypatch.setattr(beer_defects_app.query_cache, "path", "query_cache.sqlite")
+    for path in ("/search", "/troubleshoot", "/api/troubleshoot/rank"):
+        assert not beer_defects_asgi.runs_inline(scope(path))
+    assert beer_defects_asgi.runs_inline(scope("/defect/Diacetyl"))
+
+
+def test_warm_catalog_compresses_every_page():
+    catalog = beer_defects_app.Catalog(beer_defects_app.flavor_defects)
+    catalog.warm()
+    encoded = len(catalog.encoded_pages)
+
+    client = beer_defects_app.app.test_client()
+    original = beer_defects_app.catalog
+    beer_defects_app.catalog = catalog
+    try:
+        for name in catalog.defects:
+            for encoding in beer_defects_app.page_encodings:
+                headers = {"Accept-Encoding": encoding}
+                assert client.get(f"/defect/{name}", headers=headers).status_code == 200
+                assert client.get(f"/api/defects/{name}", headers=headers).status_code == 200
+    finally:
+        beer_defects_app.catalog = original
+    assert len(catalog.encoded_pages) == encoded
@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+
+import pytest
+
+from catalog_export import export_writers
+from catalog_store import defect_from_row, read_xlsx
+from compact_catalog import CompactCatalog
+
+# Missing fields, non-ASCII text, commas, quotes and newlines in cells
+defects = {
+    "Diacetyl": {
+        "Chemical Makeup": "2,3-Butanedione",
+        "Off-Flavors": ["Buttery", "Butterscotch"],
+        "Solutions": ["Allow a \"diacetyl rest\"", "Check for\ninfection"],
+        "Category": "Fermentation",
+    },
+    "Café Sourness": {
+        "Off-Flavors": ["Tart"],
+        "Learn More": "https://example.com/sour?a=1,b=2",
+    },
+    "Empty": {},
+}
+
+
+def export(catalog, export_format):
+    return b"".join(export_writers[export_format](catalog))
+
+
+def test_csv_round_trip():
+    rows = csv.reader(io.StringIO(export(defects, "csv").decode("utf-8")))
+    header = next(rows)
+    assert header[0] == ""
+    read = {row[0]: defect_from_row(dict(zip(header[1:], row[1:]))) for row in rows}
+    assert read == defects
+
+
+def test_xlsx_round_trip(tmp_path):
+    pytest.importorskip("openpyxl")
+    path = tmp_path / "catalog.xlsx"
+    path.write_bytes(export(defects, "xlsx"))
+    assert read_xlsx(str(path)) == defects
+
+
+def test_json_round_trip():
+    assert json.loads(export(defects, "json")) == defects
+
+
+def test_ndjson_round_trip():
+    lines = export(defects, "ndjson").decode("utf-8").splitlines()
+    read = {}
+    for line in lines:
+        entry = json.loads(line)
+        read[entry.pop("name")] = entry
+    assert read == defects
+    assert list(read) == list(defects)
+
+
+@pytest.mark.parametrize("export_format", ["csv", "json", "ndjson"])
+def test_compact_catalog_exports_the_same(export_format):
+    compact = CompactCatalog.from_defects(defects, "test")
+    assert export(compact, export_format) == export(defects, export_format)
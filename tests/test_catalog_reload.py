@@ -0,0 +1,37 @@
+import threading
+
+import beer_defects_app
+from catalog_store import write_sqlite
+
+
+def test_changed_source_is_reloaded_off_the_request(tmp_path, monkeypatch):
+    source = str(tmp_path / "catalog.sqlite")
+    defects = dict(beer_defects_app.flavor_defects)
+    write_sqlite(defects, source)
+    monkeypatch.setattr(beer_defects_app, "catalog_source", source)
+    monkeypatch.setattr(beer_defects_app, "catalog_source_stamp", None)
+    monkeypatch.setattr(beer_defects_app, "catalog_check_interval", 0.0)
+    original = beer_defects_app.catalog
+    client = beer_defects_app.app.test_client()
+
+    # Hold the new version in warm() until the request has been answered
+    release = threading.Event()
+    warm = beer_defects_app.Catalog.warm
+
+    def held_warm(catalog):
+        release.wait(10)
+        warm(catalog)
+
+    monkeypatch.setattr(beer_defects_app.Catalog, "warm", held_warm)
+    try:
+        write_sqlite(dict(defects, Extra={"Off-Flavors": ["Tart"]}), source)
+        assert client.get("/defect/Extra").status_code == 404
+        assert beer_defects_app.catalog is original
+
+        release.set()
+        beer_defects_app.catalog_reload_thread.join(10)
+        assert "Extra" in beer_defects_app.catalog.defects
+        assert client.get("/defect/Extra").status_code == 200
+    finally:
+        release.set()
+        beer_defects_app.refresh_catalog()
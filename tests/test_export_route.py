@@ -0,0 +1,49 @@
+import io
+
+import pytest
+
+import beer_defects_app
+
+
+@pytest.fixture
+def client():
+    return beer_defects_app.app.test_client()
+
+
+def test_xlsx_export_is_built_once_per_catalog_version(client, monkeypatch):
+    openpyxl = pytest.importorskip("openpyxl")
+    builds = []
+    xlsx_chunks = beer_defects_app.export_writers["xlsx"]
+
+    def counted(defects):
+        builds.append(len(defects))
+        return xlsx_chunks(defects)
+
+    monkeypatch.setitem(beer_defects_app.export_writers, "xlsx", counted)
+    # A catalog of its own, so no earlier export of it is kept
+    defects = dict(beer_defects_app.flavor_defects, Extra={"Off-Flavors": ["Tart"]})
+    beer_defects_app.refresh_catalog(defects)
+    try:
+        first = client.get("/export")
+        second = client.get("/export")
+        assert first.status_code == second.status_code == 200
+        assert first.data == second.data
+        assert builds == [len(defects)]
+
+        workbook = openpyxl.load_workbook(io.BytesIO(second.data), read_only=True)
+        names = [row[0] for row in workbook.active.iter_rows(min_row=2, values_only=True)]
+        assert names == list(defects)
+
+        revalidated = client.get("/export", headers={"If-None-Match": first.headers["ETag"]})
+        assert revalidated.status_code == 304
+        assert builds == [len(defects)]
+    finally:
+        beer_defects_app.refresh_catalog()
+
+
+def test_csv_export_streams_the_catalog(client):
+    response = client.get("/export?format=csv")
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == len(beer_defects_app.catalog.defects) + 1
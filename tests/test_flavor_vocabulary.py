@@ -0,0 +1,15 @@
+from flavor_vocabulary import FlavorVocabulary
+
+
+def test_trigram_index_is_built_up_front():
+    vocabulary = FlavorVocabulary(["buttery", "cardboard"])
+    assert vocabulary.trigram_index is not None
+    assert vocabulary.lookup("cardbaord") == ["cardboard"]
+
+
+def test_exact_texts_have_lists_of_their_own():
+    vocabulary = FlavorVocabulary(["butter", "buttery"], {"butterscotch": "buttery"})
+    assert vocabulary.lookup("butter") == ["butter", "buttery"]
+    vocabulary.lookup("butter").append("changed")
+    assert vocabulary.by_key["butter"] == ["butter", "buttery"]
+    assert vocabulary.by_text["buttery"] == ["butter", "buttery"]
@@ -0,0 +1,24 @@
+import beer_defects_app
+
+
+def done_status(job):
+    return {"id": job, "status": "done", "mimetype": "text/csv", "filename": "beer_defects.csv"}
+
+
+def test_download_of_a_removed_result_is_not_found(tmp_path, monkeypatch):
+    monkeypatch.setattr(beer_defects_app.job_runner, "status", done_status)
+    monkeypatch.setattr(beer_defects_app.job_runner, "result", lambda job: str(tmp_path / "missing"))
+    response = beer_defects_app.app.test_client().get("/jobs/abc/download")
+    assert response.status_code == 404
+
+
+def test_download_sends_the_result(tmp_path, monkeypatch):
+    result = tmp_path / "result"
+    result.write_bytes(b"name\nDiacetyl\n")
+    monkeypatch.setattr(beer_defects_app.job_runner, "status", done_status)
+    monkeypatch.setattr(beer_defects_app.job_runner, "result", lambda job: str(result))
+    response = beer_defects_app.app.test_client().get("/jobs/abc/download")
+    assert response.status_code == 200
+    assert response.data == b"name\nDiacetyl\n"
+    assert response.content_length == len(b"name\nDiacetyl\n")
+    response.close()
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+import beer_defects_app
+from beer_defects_app import app, metrics
+
+
+def request_count(route, status):
+    key = ("beer_defects_requests_total", (("method", "GET"), ("route", route), ("status", str(status))))
+    return metrics.counters.get(key, 0)
+
+
+def span_count(name):
+    values = metrics.histograms.get(("beer_defects_span_duration_seconds", (("span", name),)))
+    return 0 if values is None else sum(values[:-1])
+
+
+def test_unhandled_exception_counts_as_500(monkeypatch):
+    def fail():
+        raise RuntimeError("broken")
+
+    monkeypatch.setitem(app.view_functions, "list_defects", fail)
+    monkeypatch.setitem(app.config, "PROPAGATE_EXCEPTIONS", True)
+    before = request_count("/defects", 500)
+    with pytest.raises(RuntimeError):
+        app.test_client().get("/defects")
+    assert request_count("/defects", 500) == before + 1
+
+
+def test_streamed_export_is_timed_until_closed(monkeypatch):
+    def slow_chunks(defects, export_format):
+        time.sleep(0.05)
+        yield b"name\n"
+
+    monkeypatch.setattr(beer_defects_app, "export_chunks", slow_chunks)
+    key = ("beer_defects_request_duration_seconds", (("method", "GET"), ("route", "/export")))
+    before = list(metrics.histograms.get(key, [0] * 16))
+    response = app.test_client().get("/export?format=csv")
+    assert response.get_data() == b"name\n"
+    response.close()
+    after = metrics.histograms[key]
+    assert after[-1] - before[-1] >= 0.05
+
+
+def test_catalog_build_records_no_render_spans():
+    before = span_count("render.defect")
+    beer_defects_app.Catalog(beer_defects_app.flavor_defects)
+    assert span_count("render.defect") == before
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+import beer_defects_app
+
+
+@pytest.mark.skipif(bool(os.environ.get("BEER_DEFECTS_PANEL_DB")), reason="panel database configured")
+def test_panel_database_defaults_to_the_instance_folder():
+    assert os.path.dirname(beer_defects_app.panel_path) == beer_defects_app.app.instance_path
+
+
+def test_panel_store_creates_its_directory(tmp_path, monkeypatch):
+    path = tmp_path / "panel" / "panel.sqlite"
+    monkeypatch.setattr(beer_defects_app, "panel_path", str(path))
+    monkeypatch.setattr(beer_defects_app, "panel_store", None)
+    response = beer_defects_app.app.test_client().get("/panel")
+    assert response.status_code == 200
+    assert path.exists()
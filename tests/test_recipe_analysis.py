@@ -0,0 +1,63 @@
+import pytest
+
+from recipe_analysis import RuleIndex, parse_recipe_value, rule_interval
+
+
+def test_rule_index_finds_overlapping_rules():
+    rules = [
+        {"parameter": "mash_ph", "above": 6.0, "defect": "Astringency"},
+        {"parameter": "mash_ph", "at_least": 5.0, "at_most": 6.5, "defect": "Other"},
+        {"parameter": "boil_time", "below": 60, "defect": "DMS (Dimethyl Sulfide)"},
+    ]
+    index = RuleIndex(rules)
+    assert index.evaluate({"mash_ph": 6.2, "boil_time": 90}) == rules[:2]
+    assert index.evaluate({"mash_ph": 6.0, "boil_time": 45}) == rules[1:]
+    assert index.evaluate({"mash_ph": float("nan")}) == []
+
+
+def test_single_value_rule():
+    index = RuleIndex([{"parameter": "pitch_rate", "at_least": 1, "at_most": 1, "defect": "Diacetyl"}])
+    assert len(index.evaluate({"pitch_rate": 1})) == 1
+    assert index.evaluate({"pitch_rate": 1.5}) == []
+
+
+@pytest.mark.parametrize("rule", [
+    {"parameter": "mash_temp", "above": 5, "below": 5, "defect": "Astringency"},
+    {"parameter": "mash_temp", "at_least": 170, "at_most": 150, "defect": "Astringency"},
+])
+def test_empty_range_rule_is_rejected(rule):
+    with pytest.raises(ValueError, match="matches no values"):
+        rule_interval(rule)
+    with pytest.raises(ValueError, match="matches no values"):
+        RuleIndex([{"parameter": "mash_temp", "above": 160, "defect": "Astringency"}, rule])
+
+
+def test_unbounded_rule_is_rejected():
+    with pytest.raises(ValueError, match="no bounds"):
+        rule_interval({"parameter": "mash_temp", "defect": "Astringency"})
+
+
+@pytest.mark.parametrize("text", ["nan", "NaN", "inf", "-inf", "Infinity"])
+def test_non_finite_recipe_values_are_rejected(text):
+    with pytest.raises(ValueError):
+        parse_recipe_value(text)
+
+
+def test_recipe_form_rejects_non_finite_values():
+    import beer_defects_app
+
+    client = beer_defects_app.app.test_client()
+    for text in ("nan", "inf", "-inf"):
+        response = client.post("/analyze", data={"ferment_temp": text})
+        assert response.status_code == 400
+        assert b"Invalid value for ferment_temp" in response.data
+    assert client.post("/analyze", data={"ferment_temp": "72.5"}).status_code == 200
+
+
+def test_batch_log_ignores_non_finite_values():
+    pd = pytest.importorskip("pandas")
+    from recipe_analysis import analyze_batch_frame
+
+    index = RuleIndex([{"parameter": "ferment_temp", "above": 70, "defect": "Alcoholic"}])
+    frame = pd.DataFrame({"batch": ["a", "b", "c"], "ferment_temp": ["inf", "nan", "75"]})
+    assert analyze_batch_frame(frame, index)["batch"].tolist() == ["c"]